@@ -0,0 +1,193 @@
+"""
+Microbenchmarks for the rule-based part of the dose instruction parser
+
+Times di_prepare.pre_process, the dosage, frequency and duration rules
+and parser._combine_split_dis on the inputs of the existing unit tests.
+Inputs are read from the pytest.mark.parametrize lists in
+dose_instruction_parser/tests without importing the test modules, so
+no spaCy model is needed and this runs on any machine.
+
+Results are saved as JSON. Comparing against an earlier run exits with
+an error if any benchmark has slowed down by more than --max-slowdown,
+so rule-side regressions can be caught in CI.
+
+Memoization of the rule functions is turned off so every call does the
+work. Use --cached to time with it on, where repeats of each input are
+cache hits.
+
+Usage:
+    python benchmark/rules_benchmark.py -o rules_results.json
+    python benchmark/rules_benchmark.py --filter frequency
+    python benchmark/rules_benchmark.py --compare old.json new.json --max-slowdown 0.2
+"""
+import argparse
+import ast
+import json
+import platform
+import statistics
+import sys
+import time
+from copy import deepcopy
+from datetime import datetime, timezone
+from os import path
+
+import dose_instruction_parser
+from dose_instruction_parser import di_cache, di_prepare, di_dosage, di_frequency, di_duration, parser
+
+TESTS_DIR = path.join(path.dirname(dose_instruction_parser.__file__), "tests")
+
+# Benchmark name: (function, test file, test function, positions of
+# test arguments to pass to function)
+BENCHMARKS = {
+    "pre_process": (di_prepare.pre_process, "test_prepare.py", "test_pre_process", (0,)),
+    "get_dosage_info": (di_dosage.get_dosage_info, "test_dosage.py", "test_dosage_info", (0,)),
+    "to_singular": (di_dosage._to_singular, "test_dosage.py", "test_to_singular", (0,)),
+    "get_frequency_info": (di_frequency.get_frequency_info, "test_frequency.py",
+                            "test_get_frequency_info", (0,)),
+    "get_frequency_type": (di_frequency.get_frequency_type, "test_frequency.py",
+                            "test_get_frequency_type", (0,)),
+    "get_duration_info": (di_duration.get_duration_info, "test_duration.py",
+                            "test_get_duration_info", (0,)),
+    "combine_split_dis": (lambda *dis: parser._combine_split_dis(list(dis)),
+                            "test_parser.py", "test_combine_split_dis", (0, 1)),
+}
+
+# Functions which change their arguments, so are given a fresh copy each call
+MUTATING = {"combine_split_dis"}
+
+def get_test_inputs(test_file, test_name, positions):
+    """
+    Gets the arguments of each case in the pytest.mark.parametrize list
+    of a test function, without importing the test module
+
+    Output:
+        list of tuple
+            Arguments at the given positions for each test case
+    """
+    with open(path.join(TESTS_DIR, test_file), "r") as file:
+        tree = ast.parse(file.read())
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == test_name:
+            for decorator in node.decorator_list:
+                if isinstance(decorator, ast.Call) and \
+                    getattr(decorator.func, "attr", None) == "parametrize":
+                    cases = decorator.args[1].elts
+                    return [tuple(ast.literal_eval(case.elts[i]) for i in positions)
+                                for case in cases]
+    raise ValueError(f"No parametrized test {test_name} in {test_file}")
+
+def time_benchmark(name, repeats=5, min_seconds=0.1):
+    """
+    Times a benchmark, calling the function on every input enough times
+    for each repeat to take at least min_seconds
+
+    Output:
+        dict
+            Number of inputs and calls, and time per call in nanoseconds
+            for each repeat with their min and median
+    """
+    function, test_file, test_name, positions = BENCHMARKS[name]
+    inputs = get_test_inputs(test_file, test_name, positions)
+    mutating = name in MUTATING
+
+    def run(number):
+        # Copies are made before timing starts
+        calls = [deepcopy(args) if mutating else args
+                    for _ in range(number) for args in inputs]
+        start = time.perf_counter_ns()
+        for args in calls:
+            function(*args)
+        return time.perf_counter_ns() - start
+
+    # Warm up, then find how many loops over the inputs are needed
+    run(1)
+    number = 1
+    while run(number) < min_seconds * 1e9:
+        number *= 2
+    n_calls = number * len(inputs)
+    per_call = [run(number) / n_calls for _ in range(repeats)]
+    return {
+        "name": name,
+        "inputs": len(inputs),
+        "calls_per_repeat": n_calls,
+        "ns_per_call": per_call,
+        "min_ns_per_call": min(per_call),
+        "median_ns_per_call": statistics.median(per_call)
+    }
+
+def compare(old_file, new_file, max_slowdown=None):
+    """
+    Prints the change in time per call for benchmarks in both result files
+
+    Output:
+        list of str
+            Names of benchmarks slower by more than max_slowdown
+    """
+    with open(old_file) as file:
+        old = {r["name"]: r for r in json.load(file)["results"]}
+    with open(new_file) as file:
+        new = json.load(file)["results"]
+    slower = []
+    print(f"{'benchmark':>20} {'old ns':>10} {'new ns':>10} {'change':>8}")
+    for result in new:
+        if result["name"] not in old:
+            continue
+        # Minimum is the least noisy estimate of the true time
+        before = old[result["name"]]["min_ns_per_call"]
+        after = result["min_ns_per_call"]
+        change = after / before - 1
+        print(f"{result['name']:>20} {before:>10.0f} {after:>10.0f} {change*100:>+7.1f}%")
+        if max_slowdown is not None and change > max_slowdown:
+            slower.append(result["name"])
+    return slower
+
+def get_args():
+    ap = argparse.ArgumentParser(description="Dose instruction parser rule microbenchmarks")
+    ap.add_argument("--filter", default=None,
+                    help="Only run benchmarks with names containing this")
+    ap.add_argument("--repeats", type=int, default=5,
+                    help="Number of timed repeats of each benchmark")
+    ap.add_argument("--min-seconds", type=float, default=0.1,
+                    help="Minimum time for each repeat")
+    ap.add_argument("--cached", action="store_true",
+                    help="Keep memoization of rule functions on")
+    ap.add_argument("-o", "--outfile", default="benchmark/rules_results.json",
+                    help=".json file to save results to")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                    help="Compare two result files instead of running the benchmarks")
+    ap.add_argument("--max-slowdown", type=float, default=None,
+                    help="With --compare, exit with an error if any benchmark is slower by more than this proportion, e.g. 0.2")
+    return ap.parse_args()
+
+def main():
+    args = get_args()
+    if args.compare is not None:
+        slower = compare(*args.compare, args.max_slowdown)
+        if len(slower) > 0:
+            print(f"Slower than allowed: {', '.join(slower)}")
+            sys.exit(1)
+        return
+    di_cache.configure_rule_caches(enabled=args.cached)
+    results = []
+    for name in BENCHMARKS:
+        if args.filter is not None and args.filter not in name:
+            continue
+        result = time_benchmark(name, args.repeats, args.min_seconds)
+        print(f"{name:>20}: {result['min_ns_per_call']:>10.0f} ns per call "
+              f"(median {result['median_ns_per_call']:.0f}, {result['inputs']} inputs)",
+              flush=True)
+        results.append(result)
+    metadata = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dose_instruction_parser": dose_instruction_parser.__version__,
+        "settings": {"repeats": args.repeats, "min_seconds": args.min_seconds,
+                        "cached": args.cached}
+    }
+    with open(args.outfile, "w") as file:
+        json.dump({"metadata": metadata, "results": results}, file, indent=2)
+    print(f"Saved results to {args.outfile}")
+
+if __name__ == "__main__":
+    main()
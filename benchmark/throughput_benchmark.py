@@ -0,0 +1,295 @@
+"""
+Throughput benchmark for the dose instruction parser
+
+Measures dose instructions parsed per second, p50/p99 latency and peak
+memory for DIParser.parse, parse_many, parse_many_mp and parse_many_async
+at several input sizes and numbers of workers. Runs offline using either
+the bundled sample corpus (benchmark/data/sample_dis.txt) or a seeded
+synthetic corpus, and saves results as JSON so runs can be compared.
+
+Each case runs in a fresh process so loading the model and memory use
+of earlier cases don't affect it. Latency for parse is per call. For the
+batched methods every dose instruction waits for the whole batch, so
+latency is the time per run.
+
+Usage:
+    python benchmark/throughput_benchmark.py -mod en_edris9 -o results.json
+    python benchmark/throughput_benchmark.py -mod en_edris9 --sizes 100 10000 \
+        --workers 2 4 --methods parse_many parse_many_mp --corpus synthetic
+    python benchmark/throughput_benchmark.py --compare old.json new.json
+"""
+import argparse
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from functools import partial
+import os
+from os import path
+
+METHODS = ("parse", "parse_many", "parse_many_mp", "parse_many_async")
+
+CORPORA = ("sample", "synthetic")
+
+SAMPLE_CORPUS = path.join(path.dirname(path.abspath(__file__)), "data", "sample_dis.txt")
+
+# Building blocks of synthetic dose instructions
+SYNTHETIC_PARTS = {
+    "verb": ["", "take ", "use ", "apply ", "inhale "],
+    "dosage": ["1", "2", "one", "two", "half a", "1-2", "one or two", "0.5", "5ml", "10 ml"],
+    "form": ["tablet", "tablets", "tab", "caps", "capsule", "puffs", "sachet", "drops", "patch", ""],
+    "frequency": ["daily", "twice daily", "bd", "tds", "qds", "at night", "in the morning",
+                  "every 4-6 hours", "three times a day", "once weekly", "every other day", "mane"],
+    "duration": ["", "", "", " for 7 days", " for 2 weeks", " for one month", " for 3 days"],
+    "extra": ["", "", "", " prn", " when required", " as directed", " with food"]
+}
+
+def load_sample_corpus(filepath=SAMPLE_CORPUS):
+    """
+    Reads the bundled sample dose instructions, one per line
+    """
+    with open(filepath, "r") as file:
+        return [line.strip() for line in file if line.strip() != ""]
+
+def make_synthetic_corpus(size, seed=0):
+    """
+    Generates dose instructions by combining common dosages, forms,
+    frequencies and durations, so larger corpora can be created without
+    any real data
+
+    Input:
+        size: int
+            Number of dose instructions
+        seed: int
+            Random seed so the same corpus is generated every time
+    Output:
+        list of str
+    """
+    rng = random.Random(seed)
+    parts = SYNTHETIC_PARTS
+    return [f"{rng.choice(parts['verb'])}{rng.choice(parts['dosage'])} "
+            f"{rng.choice(parts['form'])} {rng.choice(parts['frequency'])}"
+            f"{rng.choice(parts['duration'])}{rng.choice(parts['extra'])}".replace("  ", " ")
+            for _ in range(size)]
+
+def get_corpus(corpus, size, seed=0):
+    """
+    Gets size dose instructions from the sample or synthetic corpus.
+    The sample corpus is repeated and shuffled to reach size.
+    """
+    if corpus == "synthetic":
+        return make_synthetic_corpus(size, seed)
+    sample = load_sample_corpus()
+    dis = (sample * (size // len(sample) + 1))[:size]
+    random.Random(seed).shuffle(dis)
+    return dis
+
+def _peak_rss_mb(who):
+    """
+    Peak resident memory in MB of this process or its child processes,
+    or None where this isn't available
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Reported in bytes on macOS and kilobytes elsewhere
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+def _percentile(values, q):
+    """
+    Gets the q-th percentile of values by linear interpolation
+    """
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def run_case(model, method, corpus, size, workers=None, repeats=3, seed=0):
+    """
+    Runs one benchmark case in this process
+
+    Output:
+        dict
+            Case settings and measured throughput, latency and memory
+    """
+    import resource
+    from dose_instruction_parser import parser
+
+    dis = get_corpus(corpus, size, seed)
+    warm_up_dis = get_corpus(corpus, 50, seed + 1)
+    start = time.perf_counter()
+    dip = parser.DIParser(model)
+    load_seconds = time.perf_counter() - start
+    # Warm up so spelling corrections and lazy set-up aren't timed
+    dip.parse_many(warm_up_dis, progress_bar=False)
+    rss_after_load = _peak_rss_mb(resource.RUSAGE_SELF)
+
+    parse_many = {
+        "parse_many": partial(dip.parse_many, progress_bar=False),
+        "parse_many_mp": partial(dip.parse_many_mp, n_workers=workers),
+        "parse_many_async": dip.parse_many_async
+    }.get(method)
+    run_seconds = []
+    latencies = []
+    try:
+        if method == "parse_many_mp":
+            # Workers are started and load the model before timing, as
+            # they are kept for the whole of a chunked run
+            dip.open_pool(workers)
+            parse_many(warm_up_dis)
+        for _ in range(repeats):
+            run_start = time.perf_counter()
+            if method == "parse":
+                for di in dis:
+                    call_start = time.perf_counter()
+                    dip.parse(di)
+                    latencies.append(time.perf_counter() - call_start)
+            else:
+                parse_many(dis)
+            run_seconds.append(time.perf_counter() - run_start)
+    finally:
+        dip.close_pool()
+    if method != "parse":
+        latencies = run_seconds
+
+    median_seconds = statistics.median(run_seconds)
+    return {
+        "method": method,
+        "corpus": corpus,
+        "size": size,
+        "workers": workers,
+        "repeats": repeats,
+        "model_load_seconds": load_seconds,
+        "run_seconds": run_seconds,
+        "dis_per_second": size / median_seconds if median_seconds > 0 else None,
+        "latency_p50_seconds": _percentile(latencies, 50),
+        "latency_p99_seconds": _percentile(latencies, 99),
+        "rss_after_load_mb": rss_after_load,
+        "peak_rss_mb": _peak_rss_mb(resource.RUSAGE_SELF),
+        "peak_worker_rss_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN)
+                                if method == "parse_many_mp" else None
+    }
+
+def get_cases(args):
+    """
+    Gets the settings of each case to run. Only parse_many_mp is run
+    with each number of workers.
+    """
+    cases = []
+    for corpus in args.corpus:
+        for size in args.sizes:
+            for method in args.methods:
+                for workers in (args.workers if method == "parse_many_mp" else [None]):
+                    cases.append({"model": args.model, "method": method,
+                                  "corpus": corpus, "size": size, "workers": workers,
+                                  "repeats": args.repeats, "seed": args.seed})
+    return cases
+
+def get_metadata(args):
+    """
+    Records the environment so results from different runs can be compared
+    """
+    from importlib.metadata import version, PackageNotFoundError
+    versions = {}
+    for package in ("dose_instruction_parser", "spacy"):
+        try:
+            versions[package] = version(package)
+        except PackageNotFoundError:
+            versions[package] = None
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+        "settings": {k: v for k, v in vars(args).items()
+                        if k not in ("run_case", "compare", "outfile")}
+    }
+
+def compare(old_file, new_file):
+    """
+    Prints the change in throughput for cases in both result files
+    """
+    with open(old_file) as file:
+        old = json.load(file)
+    with open(new_file) as file:
+        new = json.load(file)
+    key = lambda r: (r["method"], r["corpus"], r["size"], r["workers"])
+    old_results = {key(r): r for r in old["results"]}
+    print(f"{'method':>17} {'corpus':>9} {'size':>7} {'workers':>7} "
+          f"{'old dis/s':>11} {'new dis/s':>11} {'change':>8}")
+    for result in new["results"]:
+        if key(result) not in old_results:
+            continue
+        before = old_results[key(result)]["dis_per_second"]
+        after = result["dis_per_second"]
+        print(f"{result['method']:>17} {result['corpus']:>9} {result['size']:>7} "
+              f"{str(result['workers']):>7} {before:>11.1f} {after:>11.1f} "
+              f"{(after / before - 1)*100:>+7.1f}%")
+
+def get_args():
+    ap = argparse.ArgumentParser(description="Dose instruction parser throughput benchmark")
+    ap.add_argument("-mod", "--model", default="en_edris9",
+                    help="Name of installed model or path to model")
+    ap.add_argument("--methods", nargs="+", choices=METHODS, default=list(METHODS))
+    ap.add_argument("--corpus", nargs="+", choices=CORPORA, default=["sample"])
+    ap.add_argument("--sizes", nargs="+", type=int, default=[100, 1000, 10000],
+                    help="Numbers of dose instructions to parse")
+    ap.add_argument("--workers", nargs="+", type=int, default=[2, 4],
+                    help="Numbers of worker processes for parse_many_mp")
+    ap.add_argument("--repeats", type=int, default=3,
+                    help="Number of timed runs of each case")
+    ap.add_argument("--seed", type=int, default=0,
+                    help="Random seed for shuffling and generating corpora")
+    ap.add_argument("-o", "--outfile", default="benchmark/throughput_results.json",
+                    help=".json file to save results to")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                    help="Compare two result files instead of running the benchmark")
+    ap.add_argument("--run-case", help=argparse.SUPPRESS)
+    return ap.parse_args()
+
+def main():
+    args = get_args()
+    if args.compare is not None:
+        compare(*args.compare)
+        return
+    if args.run_case is not None:
+        # Run a single case in this process and print the result
+        print(json.dumps(run_case(**json.loads(args.run_case))))
+        return
+    results = []
+    for case in get_cases(args):
+        print(f"Running {case['method']} on {case['size']} {case['corpus']} "
+              f"dose instructions" +
+              (f" with {case['workers']} workers" if case["workers"] else ""),
+              flush=True)
+        output = subprocess.run([sys.executable, path.abspath(__file__),
+                                    "--run-case", json.dumps(case)],
+                                capture_output=True, text=True, check=True)
+        result = json.loads(output.stdout.strip().splitlines()[-1])
+        print(f"    {result['dis_per_second']:.1f} dis/s, "
+              f"p50 {result['latency_p50_seconds']*1e3:.3f}ms, "
+              f"p99 {result['latency_p99_seconds']*1e3:.3f}ms, "
+              f"peak memory {result['peak_rss_mb']:.0f}MB", flush=True)
+        results.append(result)
+    with open(args.outfile, "w") as file:
+        json.dump({"metadata": get_metadata(args), "results": results}, file, indent=2)
+    print(f"Saved results to {args.outfile}")
+
+if __name__ == "__main__":
+    main()
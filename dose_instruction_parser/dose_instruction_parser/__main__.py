@@ -1,9 +1,11 @@
 import argparse
+import json
 import logging
 import sys
 from textwrap import dedent
-from os import path
-import pandas as pd
+from os import path, remove, replace, stat, truncate
+from functools import partial
+from itertools import islice
 
 def main():
     """Parse dose instructions"""
@@ -40,41 +42,328 @@ def main():
         args.infile, args.outfile
     )
 
+    if args.resume:
+        assert args.chunksize is not None and args.outfile is not None, \
+            "--resume requires --chunksize and --outfile"
+        assert ofext in [".txt", ".csv"], \
+            "--resume requires a .txt or .csv outfile"
+
     # Set up parser
     logging.info("Setting up parser")
     from .parser import DIParser
+    from . import di_prepare
     dip = DIParser(model_name=args.model)
+    if args.profile is not None:
+        logging.info("Recording time taken by each stage of parsing")
+        profiler = dip.enable_profiling()
+        if args.parallel == 'True':
+            logging.warning("Stages are not timed in worker processes with --parallel True")
+    if args.diagnostics == "count":
+        logging.info("Counting ambiguities found when parsing")
+        diagnostics = dip.enable_diagnostics(keep_events=False)
+    elif args.diagnostics == "off":
+        dip.disable_diagnostics(warn=False)
+    if args.spellcache is not None and path.exists(args.spellcache):
+        logging.info(f"Loading spelling corrections from {args.spellcache}")
+        di_prepare.spell_cache.load(args.spellcache)
 
+    # Serve requests until interrupted
+    if args.serve:
+        from .server import serve
+        serve(dip, host=args.host, port=args.port, socket_path=args.socket)
     # Check if single di provided
-    if single_di:
+    elif single_di:
         logging.info("Parsing single dose instruction")
         parsed_di = dip.parse(args.doseinstruction)
         write_out(args.doseinstruction, parsed_di, args.outfile)
     else:
         logging.info("Parsing multiple dose instructions")
-        if ifext == ".txt":
-            with open(args.infile, "r") as file:
-                    dis = [l.strip() for l in file.readlines()]
-            if args.parallel == 'True':
-                out = dip.parse_many_mp(dis)
-            else:  
-                out = dip.parse_many(dis)
-        elif ifext == ".csv":
-            di_info = pd.read_csv(args.infile)
-            dis = di_info["di"].to_list()
-            if args.parallel == 'True':
-                logging.info("Using multiprocessing")
-                out = dip.parse_many_mp(dis, di_info["inputID"].to_list())
-            elif args.parallel == 'False':  
-                out = dip.parse_many(dis, di_info["inputID"].to_list())
-            elif args.parallel == 'async':
-                logging.info("Using asynchronous processing")
-                out = dip.parse_many_async(dis, di_info["inputID"].to_list())
-        else: 
-            logging.error(f"Input file {args.infile} must be .txt or .csv")    
-            
-        logging.info("Writing output")    
-        write_out(dis, out, args.outfile)
+        columns = (args.id_column, args.di_column)
+        parse_many = get_parse_many(dip, args.parallel, args.workers, 
+                                    args.columnar)
+        if args.deduplicate:
+            parse_many = partial(dip.parse_many_deduplicated, 
+                                    parse_many=parse_many)
+        try:
+            if args.chunksize is None:
+                dis, rowids = read_in(args.infile, ifext, columns)
+                out = parse_many(dis, rowids)
+                logging.info("Writing output")    
+                write_out(dis, out, args.outfile)
+            else:
+                # Stream input in chunks, appending output after each chunk
+                logging.info(f"Streaming input in chunks of {args.chunksize}")
+                # .parquet and .arrow files are written with one row group per 
+                # chunk but can't be truncated so aren't checkpointed
+                writer = open_writer(args.outfile)
+                checkpoint = None if args.outfile is None or writer is not None \
+                    else args.outfile + ".checkpoint"
+                chunks_done = 0
+                if args.resume:
+                    chunks_done = resume_from_checkpoint(checkpoint, args.infile, 
+                                                            args.chunksize, args.outfile)
+                chunks = read_in_chunks(args.infile, ifext, args.chunksize, columns)
+                try:
+                    for i, (dis, rowids) in enumerate(chunks):
+                        if i < chunks_done:
+                            continue
+                        out = parse_many(dis, rowids)
+                        write_out(dis, out, args.outfile, append=(i > 0), writer=writer)
+                        logging.info(f"Written chunk {i} ({len(dis)} dose instructions)")
+                        if checkpoint is not None:
+                            save_checkpoint(checkpoint, args.infile, args.chunksize, 
+                                            i + 1, args.outfile)
+                finally:
+                    # Finish the file so chunks already written can be read
+                    if writer is not None:
+                        writer.close()
+                if checkpoint is not None and path.exists(checkpoint):
+                    remove(checkpoint)
+        finally:
+            # Stop worker processes kept for all chunks by get_parse_many
+            dip.close_pool()
+
+    if args.profile is not None:
+        logging.info(f"Time taken by each stage of parsing:\n{profiler.summary()}")
+        if args.profile != "":
+            logging.info(f"Saving profile to {args.profile}")
+            save_profile(profiler, args.profile)
+
+    if args.diagnostics == "count":
+        logging.info(diagnostics.summary())
+
+    if args.spellcache is not None:
+        logging.info(f"Saving spelling corrections to {args.spellcache}")
+        logging.info(f"Spelling correction cache: {di_prepare.spell_cache.cache_info()}")
+        di_prepare.spell_cache.save(args.spellcache)
+
+# Compressions which .txt and .csv input files can be read with
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+def get_input_format(infile):
+    """
+    Gets the format and compression of an input file from its extensions,
+    e.g. "dis.csv.gz" -> (".csv", "gzip"). Compression is None for
+    uncompressed files.
+    """
+    fname, fext = path.splitext(infile)
+    compression = COMPRESSIONS.get(fext)
+    if compression is not None:
+        fname, fext = path.splitext(fname)
+    return fext, compression
+
+def _open_text(infile, compression):
+    """
+    Opens a possibly compressed text file for reading
+    """
+    if compression == "gzip":
+        import gzip
+        return gzip.open(infile, "rt")
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError("zstandard is required for .zst input files. "
+                "Install it with: pip install dose_instruction_parser[zstd]") from e
+        return zstandard.open(infile, "rt")
+    return open(infile, "r")
+
+def _get_record_batches(infile, ifext, columns, batch_size=None):
+    """
+    Reads record batches of the given columns from a .parquet or
+    Arrow IPC (.arrow) file without reading the whole file
+    """
+    from .di_arrow import _import_pyarrow
+    pa = _import_pyarrow()
+    if ifext == ".parquet":
+        import pyarrow.parquet as pq
+        pfile = pq.ParquetFile(infile)
+        names = pfile.schema_arrow.names
+        batches = pfile.iter_batches(batch_size=batch_size or 65536, 
+                                        columns=list(columns))
+    else:
+        import pyarrow.ipc
+        reader = pa.ipc.open_file(pa.memory_map(infile))
+        names = reader.schema.names
+        batches = (reader.get_batch(i).select(list(columns)) 
+                    for i in range(reader.num_record_batches))
+    assert set(columns) <= set(names), \
+        f"Input file must have columns {list(columns)}. Detected columns: {names}."
+    return batches
+
+def _rechunk(chunks, chunksize):
+    """
+    Splits and combines chunks of dose instructions and input IDs 
+    so every chunk but the last has exactly chunksize rows
+    """
+    dis, rowids = [], []
+    for chunk_dis, chunk_rowids in chunks:
+        dis.extend(chunk_dis)
+        rowids.extend(chunk_rowids)
+        while len(dis) >= chunksize:
+            yield dis[:chunksize], rowids[:chunksize]
+            dis, rowids = dis[chunksize:], rowids[chunksize:]
+    if len(dis) > 0:
+        yield dis, rowids
+
+def _read_csv(infile, columns, compression, chunksize=None):
+    """
+    Reads the input ID and dose instruction columns of a .csv file,
+    optionally in chunks. When reading in chunks input IDs are read as
+    strings, as types are otherwise found separately for each chunk and
+    so may differ between chunks.
+    """
+    import pandas as pd
+    dtype = None if chunksize is None else {columns[0]: str}
+    try:
+        return pd.read_csv(infile, usecols=list(columns), dtype=dtype,
+                            compression=compression, chunksize=chunksize)
+    except ValueError as e:
+        raise ValueError(f"Input .csv file must have columns {list(columns)}") from e
+
+def read_in(infile, ifext, columns=("inputID", "di")):
+    """
+    Reads dose instructions and input IDs from file. Input IDs are
+    None for a .txt file.
+
+    Input:
+        infile: str
+            Path of .txt, .csv, .parquet or .arrow file. .txt and .csv 
+            files may be compressed with gzip (.gz) or zstd (.zst).
+        ifext: str
+            Format of input file, from get_input_format
+        columns: tuple(str, str)
+            Names of input ID and dose instruction columns
+    """
+    id_column, di_column = columns
+    compression = get_input_format(infile)[1]
+    if ifext == ".txt":
+        with _open_text(infile, compression) as file:
+            dis = [l.strip() for l in file.readlines()]
+        rowids = None
+    elif ifext == ".csv":
+        di_info = _read_csv(infile, columns, compression)
+        dis = di_info[di_column].to_list()
+        rowids = di_info[id_column].to_list()
+    elif ifext in [".parquet", ".arrow"]:
+        dis, rowids = [], []
+        for batch in _get_record_batches(infile, ifext, columns):
+            dis.extend(batch.column(di_column).to_pylist())
+            rowids.extend(batch.column(id_column).to_pylist())
+    else: 
+        logging.error(f"Input file {infile} must be .txt, .csv, .parquet or .arrow")
+    return dis, rowids
+
+def read_in_chunks(infile, ifext, chunksize, columns=("inputID", "di")):
+    """
+    Reads dose instructions and input IDs from file in chunks of 
+    chunksize rows, so the whole file is never held in memory.
+    Input IDs for a .txt file number lines from 0, and are read as 
+    strings from a .csv file so they have the same type in every chunk.
+
+    Output:
+        generator of tuple(list, list)
+            Dose instructions and input IDs for each chunk
+    """
+    id_column, di_column = columns
+    compression = get_input_format(infile)[1]
+    if ifext == ".txt":
+        with _open_text(infile, compression) as file:
+            start = 0
+            while True:
+                dis = [l.strip() for l in islice(file, chunksize)]
+                if len(dis) == 0:
+                    break
+                yield dis, list(range(start, start + len(dis)))
+                start += len(dis)
+    elif ifext == ".csv":
+        for di_info in _read_csv(infile, columns, compression, chunksize):
+            yield di_info[di_column].to_list(), di_info[id_column].to_list()
+    elif ifext in [".parquet", ".arrow"]:
+        batches = _get_record_batches(infile, ifext, columns, chunksize)
+        yield from _rechunk(((batch.column(di_column).to_pylist(), 
+                                batch.column(id_column).to_pylist())
+                                for batch in batches), chunksize)
+    else: 
+        logging.error(f"Input file {infile} must be .txt, .csv, .parquet or .arrow")
+
+def _get_input_version(infile):
+    """
+    Gets the size and modification time of an input file, which change 
+    if the file is replaced or appended to
+    """
+    info = stat(infile)
+    return {"infile_size": info.st_size, "infile_mtime_ns": info.st_mtime_ns}
+
+def save_checkpoint(checkpoint, infile, chunksize, chunks_done, outfile):
+    """
+    Records how many chunks of the input file have been written out,
+    along with the size of the output file at that point
+    """
+    info = {"infile": path.abspath(infile), **_get_input_version(infile),
+            "chunksize": chunksize, "chunks_done": chunks_done, 
+            "outfile_size": path.getsize(outfile)}
+    # Write to a temporary file first so the checkpoint is never half written
+    with open(checkpoint + ".tmp", "w") as file:
+        json.dump(info, file)
+    replace(checkpoint + ".tmp", checkpoint)
+
+def resume_from_checkpoint(checkpoint, infile, chunksize, outfile):
+    """
+    Gets the number of chunks already written out by an interrupted run,
+    removing anything written to the output file after the last checkpoint
+
+    Output:
+        int
+            Number of chunks of the input file to skip
+    """
+    if checkpoint is None or not path.exists(checkpoint):
+        logging.info("No checkpoint found so starting from the beginning")
+        return 0
+    with open(checkpoint, "r") as file:
+        info = json.load(file)
+    assert info["infile"] == path.abspath(infile) and info["chunksize"] == chunksize, \
+        f"Checkpoint {checkpoint} was created for input file {info['infile']} " \
+        f"with chunk size {info['chunksize']}"
+    version = _get_input_version(infile)
+    assert all(info.get(key) == value for key, value in version.items()), \
+        f"Input file {infile} has changed since checkpoint {checkpoint} was " \
+        f"created, so output can't be resumed. Remove the checkpoint to start again."
+    # Remove output from a partly written chunk
+    truncate(outfile, info["outfile_size"])
+    logging.info(f"Resuming after {info['chunks_done']} chunks from {checkpoint}")
+    return info["chunks_done"]
+
+def save_profile(profiler, profile_file):
+    """
+    Saves timings in Prometheus text format for a .prom file,
+    otherwise as a JSON report
+    """
+    if path.splitext(profile_file)[1] == ".prom":
+        profiler.to_prometheus(profile_file)
+    else:
+        profiler.to_json(profile_file)
+
+def get_parse_many(dip, parallel, workers=None, columnar=False):
+    """
+    Gets the DIParser method to parse multiple dose instructions with
+    """
+    assert not columnar or parallel == 'False', \
+        "--columnar can only be used with --parallel False"
+    if columnar:
+        return partial(dip.parse_many, columnar=True)
+    elif parallel == 'True':
+        logging.info("Using multiprocessing")
+        # Workers are kept for every call, e.g. each chunk of a large input
+        # file, so the model is only loaded once by each. Close with 
+        # dip.close_pool.
+        dip.open_pool(workers)
+        return dip.parse_many_mp
+    elif parallel == 'async':
+        logging.info("Using asynchronous processing")
+        return dip.parse_many_async
+    else:
+        return dip.parse_many
 
 def get_args(): 
     ap = argparse.ArgumentParser(
@@ -94,17 +383,66 @@ def get_args():
     )
     group = ap.add_mutually_exclusive_group(required=True)
     group.add_argument("-di", "--doseinstruction")
-    group.add_argument("-f", "--infile")
+    group.add_argument("-f", "--infile",
+                    help=".txt, .csv, .parquet or .arrow file of dose instructions. .txt and .csv files may be compressed (.gz or .zst).")
+    group.add_argument("--serve",
+                    action="store_true",
+                    help="Load the model once and serve parse requests over HTTP on --host and --port, or on --socket")
+    ap.add_argument("--id-column",
+                    default="inputID",
+                    help="Name of input ID column in .csv, .parquet or .arrow input file")
+    ap.add_argument("--di-column",
+                    default="di",
+                    help="Name of dose instruction column in .csv, .parquet or .arrow input file")
     ap.add_argument("-mod", "--model", 
                     required=False, 
                     default="en_edris9",
                     help="Name of installed model or path to model")
     ap.add_argument("-o", "--outfile", 
-                    help=".txt or .csv file to write output to")
+                    help=".txt, .csv, .parquet or .arrow file to write output to. .parquet and .arrow require pyarrow.")
     ap.add_argument("-p", "--parallel", 
                     choices=['True', 'False', 'async'], 
                     default='False',
                     help="Whether to use parallel processing")
+    ap.add_argument("-w", "--workers",
+                    type=int,
+                    default=None,
+                    help="Number of worker processes when using --parallel True. Default is the number of CPUs.")
+    ap.add_argument("--columnar",
+                    action="store_true",
+                    help="Hold parsed output in columns rather than one object per row to reduce memory use")
+    ap.add_argument("--deduplicate",
+                    action="store_true",
+                    help="Parse each distinct dose instruction once and copy results to repeated dose instructions")
+    ap.add_argument("-c", "--chunksize",
+                    type=int,
+                    default=None,
+                    help="Read, parse and write input file in chunks of this many rows. Default is to read the whole file at once.")
+    ap.add_argument("-r", "--resume",
+                    action="store_true",
+                    help="Resume an interrupted run from the checkpoint saved next to the output file. Requires --chunksize and --outfile.")
+    ap.add_argument("-sc", "--spellcache",
+                    default=None,
+                    help="Path to .json file of spelling corrections. Loaded before parsing if it exists and saved after.")
+    ap.add_argument("--host",
+                    default="127.0.0.1",
+                    help="Host to listen on with --serve")
+    ap.add_argument("--port",
+                    type=int,
+                    default=8000,
+                    help="Port to listen on with --serve")
+    ap.add_argument("--socket",
+                    default=None,
+                    help="Path of Unix domain socket to listen on with --serve instead of --host and --port")
+    ap.add_argument("--profile",
+                    nargs="?",
+                    const="",
+                    default=None,
+                    help="Log the time taken by each stage of parsing. If a file is given also save timings to it, in Prometheus text format for a .prom file or as JSON otherwise.")
+    ap.add_argument("--diagnostics",
+                    choices=["warn", "count", "off"],
+                    default="warn",
+                    help="How to report ambiguities found when parsing, e.g. more than one number for 'up to x': log a warning for each, log a count of each type at the end, or ignore them")
     ap.add_argument("-l", "--logfile",
                     default = None,
                     help="Path to logfile. Default behaviour is to log to terminal.")
@@ -119,25 +457,36 @@ def check_setup(infile, outfile):
         single_di = False
         if not path.exists(infile):
             logging.error(f"Input file {infile} does not exist.")  
-        ifname, ifext = path.splitext(infile)
-        assert ifext in [".txt", ".csv"], \
-            "Input file must be either .txt or .csv"
-        if ifext == ".csv":
-            # Check col names are correct
-            cols = pd.read_csv(infile, nrows=1).columns.tolist()
-            assert set(cols) == set(["inputID", "di"]), \
-                f"Input .csv file must have columns 'inputID' and 'di'. Detected columns: {cols}."
+        # Column names are checked when the file is read
+        ifext, compression = get_input_format(infile)
+        assert ifext in [".txt", ".csv", ".parquet", ".arrow"], \
+            "Input file must be .txt, .csv, .parquet or .arrow"
+        assert compression is None or ifext in [".txt", ".csv"], \
+            "Only .txt and .csv input files can be compressed"
     # Output
     if outfile is None:
         ofext = None
     else:
         ofname, ofext = path.splitext(outfile)
-        assert ofext in [".txt", ".csv"], \
-            "Out file must be either .txt or .csv"
+        assert ofext in [".txt", ".csv", ".parquet", ".arrow"], \
+            "Out file must be .txt, .csv, .parquet or .arrow"
     return single_di, ifext, ofext
     
-def write_out(dis, out, outfile):
-    if outfile is None:
+def open_writer(outfile):
+    """
+    Opens a writer to write output to a .parquet or .arrow file in 
+    row groups. Returns None for other output.
+    """
+    if outfile is None or path.splitext(outfile)[1] not in [".parquet", ".arrow"]:
+        return None
+    from .di_arrow import ArrowWriter
+    return ArrowWriter(outfile)
+
+def write_out(dis, out, outfile, append=False, writer=None):
+    if writer is not None:
+        # Write to file already opened by open_writer
+        writer.write(out)
+    elif outfile is None:
         # No outfile specified so just print to terminal
         for line in out: print(line)
     else:
@@ -145,16 +494,28 @@ def write_out(dis, out, outfile):
         if fext == ".txt":
             # For text file print structured output line by line
             try:
-                with open(outfile, "w+") as file:
+                with open(outfile, "a" if append else "w+") as file:
+                    if append and len(out) > 0:
+                        file.write("\n")
                     file.write("\n".join(str(i) for i in out))    
             except (OSError, RuntimeError):
                 logging.warning(f"Could not write to file: {outfile}")
         elif fext == ".csv":
             # For csv convert output to dataframe
+            import pandas as pd
+            from .di_columnar import StructuredDIColumns
             logging.info("Converting output to dataframe")
-            df = pd.DataFrame(out)
+            if isinstance(out, StructuredDIColumns):
+                df = out.to_dataframe()
+            else:
+                df = pd.DataFrame(out)
+            logging.info(f"Saving out to {outfile}")
+            df.to_csv(outfile, index=False, mode="a" if append else "w",
+                        header=not append)
+        elif fext in [".parquet", ".arrow"]:
             logging.info(f"Saving out to {outfile}")
-            df.to_csv(outfile, index=False)
+            with open_writer(outfile) as writer:
+                writer.write(out)
 
 class StreamToLogger(object):
     """
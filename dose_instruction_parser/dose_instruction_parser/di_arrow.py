@@ -0,0 +1,183 @@
+from os import path
+
+from .di_columnar import (StructuredDIColumns, FIELDS, FLOAT_FIELDS,
+                            CATEGORY_FIELDS, FLAG_FIELDS)
+
+# Output file extensions written with pyarrow
+ARROW_EXTENSIONS = (".parquet", ".arrow")
+
+def _import_pyarrow():
+    """
+    Imports pyarrow, which is an optional dependency
+    """
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError(
+            "pyarrow is required for .parquet and .arrow files. "
+            "Install it with: pip install dose_instruction_parser[arrow]"
+        ) from e
+    return pyarrow
+
+def get_schema(input_id_type):
+    """
+    Gets the Arrow schema of structured dose instructions
+
+    Input:
+        input_id_type: pyarrow.DataType
+            Type of the inputID column, which depends on the input
+    Output:
+        pyarrow.Schema
+    """
+    pa = _import_pyarrow()
+    types = {"inputID": input_id_type, "text": pa.string()}
+    types.update({field: pa.float64() for field in FLOAT_FIELDS})
+    types.update({field: pa.dictionary(pa.int32(), pa.string())
+                    for field in CATEGORY_FIELDS})
+    types.update({field: pa.bool_() for field in FLAG_FIELDS})
+    return pa.schema([(field, types[field]) for field in FIELDS])
+
+class ArrowWriter:
+    """
+    Writes structured dose instructions to a .parquet or Arrow IPC (.arrow)
+    file, one row group or record batch per call to write.
+
+    Floats and booleans keep their types, with nulls for None, and form,
+    frequencyType and durationType are stored as dictionaries. The schema
+    is fixed by the first call to write, taking the type of inputID from
+    the data.
+
+    Parameters:
+    -----------
+    outfile: str
+        Path of .parquet or .arrow file to write
+    """
+    def __init__(self, outfile):
+        fext = path.splitext(outfile)[1]
+        if fext not in ARROW_EXTENSIONS:
+            raise ValueError(f"Output file must be one of: {ARROW_EXTENSIONS}")
+        self.outfile = outfile
+        self._fext = fext
+        self._writer = None
+        self._schema = None
+        # Categories are shared by all batches so Arrow IPC files only
+        # need dictionary deltas rather than replacements
+        self._categories = {field: {} for field in CATEGORY_FIELDS}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, out):
+        """
+        Writes structured dose instructions as a new row group
+
+        Input:
+            out: list of StructuredDI or di_columnar.StructuredDIColumns
+        """
+        if len(out) == 0:
+            return
+        batch = self._to_record_batch(out)
+        if self._writer is None:
+            self._open(batch.schema)
+        if self._fext == ".parquet":
+            self._writer.write_batch(batch, row_group_size=len(out))
+        else:
+            self._writer.write_batch(batch)
+
+    def close(self):
+        """
+        Finishes writing the file. If nothing was written an empty file
+        with inputID as strings is created.
+        """
+        if self._writer is None:
+            pa = _import_pyarrow()
+            self._open(get_schema(pa.string()))
+        self._writer.close()
+
+    def _open(self, schema):
+        pa = _import_pyarrow()
+        self._schema = schema
+        if self._fext == ".parquet":
+            import pyarrow.parquet as pq
+            self._writer = pq.ParquetWriter(self.outfile, schema)
+        else:
+            import pyarrow.ipc
+            options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self._writer = pa.ipc.new_file(self.outfile, schema, options=options)
+
+    def _encode(self, field, values):
+        """
+        Gets codes of category values, adding new values to the categories
+        """
+        categories = self._categories[field]
+        return [None if value is None else categories.setdefault(value, len(categories))
+                    for value in values]
+
+    def _to_record_batch(self, out):
+        """
+        Converts structured dose instructions to a pyarrow.RecordBatch
+        """
+        pa = _import_pyarrow()
+        if self._schema is None:
+            if self._fext == ".arrow":
+                # Arrow IPC files can't add a delta to an empty dictionary,
+                # so start any dictionary with no values with an unused ""
+                for field in CATEGORY_FIELDS:
+                    if all(value is None for value in self._get_column(out, field)):
+                        self._categories[field][""] = 0
+            input_id_type = pa.array(self._get_column(out, "inputID"),
+                                        from_pandas=True).type
+            if pa.types.is_null(input_id_type):
+                input_id_type = pa.string()
+            schema = get_schema(input_id_type)
+        else:
+            schema = self._schema
+        arrays = []
+        for field in FIELDS:
+            values = self._get_column(out, field)
+            if field in CATEGORY_FIELDS:
+                codes = pa.array(self._encode(field, values), type=pa.int32())
+                dictionary = pa.array(list(self._categories[field]), type=pa.string())
+                arrays.append(pa.DictionaryArray.from_arrays(codes, dictionary))
+            elif field == "inputID":
+                arrays.append(self._to_input_id_array(values, schema.field(field).type))
+            else:
+                # from_pandas treats NaN as null, e.g. for missing text read 
+                # from .csv and None stored as NaN in StructuredDIColumns
+                arrays.append(pa.array(values, type=schema.field(field).type,
+                                        from_pandas=True))
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+    @staticmethod
+    def _to_input_id_array(values, input_id_type):
+        """
+        Converts input IDs to the type fixed by the first call to write.
+        IDs are converted to strings if that type is string, e.g. numeric
+        IDs after IDs such as "A1".
+        """
+        pa = _import_pyarrow()
+        try:
+            return pa.array(values, type=input_id_type, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            if not pa.types.is_string(input_id_type):
+                raise ValueError(
+                    f"inputID values can't be converted to {input_id_type}, "
+                    "the type of inputID in the first rows written. "
+                    "Read input IDs as strings to write them.") from e
+        # Nulls stay null, including NaN for missing IDs read from .csv
+        return pa.array([None if value is None or value != value else str(value)
+                            for value in values], type=pa.string())
+
+    @staticmethod
+    def _get_column(out, field):
+        """
+        Gets the values of a field for all structured dose instructions.
+        Float columns of StructuredDIColumns are returned as arrays with
+        NaN for None.
+        """
+        if isinstance(out, StructuredDIColumns):
+            return out.column(field)
+        return [getattr(structured_di, field) for structured_di in out]
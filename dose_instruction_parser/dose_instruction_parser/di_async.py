@@ -0,0 +1,181 @@
+import asyncio
+import contextvars
+from collections import deque
+
+from .di_microbatch import (
+    DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT, join_requests, split_results
+)
+
+# Maximum number of requests waiting to be parsed at once
+DEFAULT_MAX_CONCURRENCY = 1024
+
+class AsyncMicroBatcher:
+    """
+    Collects dose instructions from concurrent coroutines into batches
+    which are parsed together in an executor, so the event loop is
+    never blocked by the model
+
+    Parameters:
+    -----------
+    parse_many: function
+        Function to parse a list of dose instructions with input IDs,
+        e.g. DIParser.parse_many
+    max_batch_size: int
+        Maximum number of dose instructions in a batch. A single request
+        with more dose instructions than this is parsed as one batch.
+    max_wait: float
+        Maximum time in seconds to wait for more requests before parsing
+    max_concurrency: int
+        Maximum number of requests waiting to be parsed. Further requests
+        wait until earlier ones finish.
+    executor: concurrent.futures.Executor (None)
+        Executor to parse batches in. Must share memory with the parser,
+        e.g. a ThreadPoolExecutor. Default is the event loop's default
+        executor.
+    """
+    def __init__(self, parse_many, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                    max_wait=DEFAULT_MAX_WAIT, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                    executor=None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.parse_many = parse_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_concurrency = max_concurrency
+        self.executor = executor
+        self._loop = None
+
+    def _start(self):
+        """
+        Creates the queue and batching task for the running event loop.
+        These belong to a single loop so are recreated if the batcher is
+        used from a new loop, e.g. by successive calls to asyncio.run.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and not self._task.done():
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._task = loop.create_task(self._run())
+
+    async def submit(self, dis, rowids=None):
+        """
+        Adds dose instructions to the next batch and waits for the results
+
+        Input:
+            dis: list of str
+                Dose instructions
+            rowids: list (None)
+                Input IDs corresponding to dose instructions
+        Output:
+            list of StructuredDI
+        """
+        self._start()
+        rowids = list(range(len(dis))) if rowids is None else list(rowids)
+        async with self._semaphore:
+            future = self._loop.create_future()
+            await self._queue.put((list(dis), rowids, future))
+            return await future
+
+    async def aclose(self):
+        """
+        Stops the batching task for the running event loop
+        """
+        if self._loop is asyncio.get_running_loop() and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._loop = None
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = self._loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size += len(request[0])
+            await self._parse_batch(batch)
+
+    async def _parse_batch(self, batch):
+        """
+        Parses a batch of requests in the executor and sets the result
+        of each request
+        """
+        # Requests cancelled while waiting don't need parsing
+        batch = [request for request in batch if not request[2].done()]
+        dis, rowids = join_requests(batch)
+        if len(dis) == 0:
+            return
+        try:
+            # Parse with this task's context, e.g. for di_diagnostics.collect_into,
+            # as executors don't copy it
+            parsed_dis = await self._loop.run_in_executor(
+                self.executor, contextvars.copy_context().run, 
+                self.parse_many, dis, rowids)
+            results = split_results(batch, parsed_dis)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+async def _aiter(iterable):
+    """
+    Iterates over a synchronous or asynchronous iterable
+    """
+    if hasattr(iterable, "__aiter__"):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
+
+async def parse_stream(batcher, dis, rowids=None):
+    """
+    Parses a stream of dose instructions through a batcher, keeping up to
+    max_batch_size dose instructions in flight so they are parsed together
+
+    Input:
+        batcher: AsyncMicroBatcher
+            Batcher to parse dose instructions with
+        dis: iterable or async iterable of str
+            Dose instructions
+        rowids: iterable (None)
+            Input IDs corresponding to dose instructions. Default numbers
+            dose instructions from 0.
+    Output:
+        async generator of StructuredDI
+            Parsed dose instructions in input order
+    """
+    rowids = iter(rowids) if rowids is not None else None
+    window = max(1, min(batcher.max_batch_size, batcher.max_concurrency))
+    pending = deque()
+    i = 0
+    try:
+        async for di in _aiter(dis):
+            rowid = next(rowids) if rowids is not None else i
+            i += 1
+            pending.append(asyncio.ensure_future(batcher.submit([di], [rowid])))
+            if len(pending) >= window:
+                for parsed_di in await pending.popleft():
+                    yield parsed_di
+        while pending:
+            for parsed_di in await pending.popleft():
+                yield parsed_di
+    finally:
+        for task in pending:
+            task.cancel()
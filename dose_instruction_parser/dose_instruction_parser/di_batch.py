@@ -0,0 +1,169 @@
+from functools import lru_cache
+
+from . import di_dosage, di_duration, di_frequency
+
+# Common patterns which are evaluated for all texts at once with pandas
+# string methods. Each gives the same result as the scalar function, and
+# texts which don't match are passed to the scalar function.
+
+# Number of mg or ml, or a number and a form word, e.g. "2", "5ml", "2 tablets"
+_re_dosage = r"(?P<num>[0-9]+(?:\.[0-9]+)?)(?: ?(?P<measure>mg|ml)| (?P<word>[a-z]+))?"
+
+# Number of times per unit, e.g. "2 times a day", "3 times daily"
+_re_frequency = r"(?P<num>[0-9]+) times? (?:a |per )?(?P<unit>day|daily|week|weekly|month|monthly|year|yearly)"
+
+# Number of units, e.g. "for 5 days", "2 weeks"
+_re_duration = r"(?:for )?(?P<num>[0-9]+) (?P<unit>days?|weeks?|months?|years?)"
+
+# Frequency and duration types of units in the patterns above
+_unit_types = {"day": "Day", "daily": "Day", "days": "Day",
+                "week": "Week", "weekly": "Week", "weeks": "Week",
+                "month": "Month", "monthly": "Month", "months": "Month",
+                "year": "Year", "yearly": "Year", "years": "Year"}
+
+@lru_cache(maxsize=None)
+def _get_plain_form_words():
+    """
+    Gets the form words which can follow a number in the dosage pattern,
+    with their singular. These are words in the table of form words
+    which don't contain a measure, a number or a range cue, e.g. "bd",
+    so the dosage is just the number.
+
+    Output:
+        dict of str to str
+            e.g. {"tablets": "tablet", "tablet": "tablet"}
+    """
+    return {word: singular for word, singular in di_dosage._get_form_words().items()
+                if "mg" not in word and "ml" not in word
+                    and di_frequency._tokenise_range("1 " + word) == ([1.0], set())}
+
+def _evaluate_batch(texts, pattern, get_types, function):
+    """
+    Evaluates a rule function for each unique text, using a regex for
+    texts which match pattern and the scalar function for the rest
+
+    Input:
+        texts: iterable of str
+            Entity texts, with None for missing entities
+        pattern: str
+            Regex with a group "num", the min and max for matching texts
+        get_types: function
+            Gets the types of texts from the DataFrame of pattern groups,
+            and whether each type is known from the groups. Texts whose
+            type isn't known are passed to function.
+        function: function
+            Scalar rule function returning min, max and type
+    Output:
+        _min: numpy.ndarray of float64
+            NaN where the min is None or the text is missing
+        _max: numpy.ndarray of float64
+            NaN where the max is None or the text is missing
+        types: pandas.Categorical
+            NaN where the type is None or the text is missing
+    """
+    import numpy as np
+    import pandas as pd
+    # Each unique text is evaluated once, missing texts have code -1
+    codes, uniques = pd.factorize(pd.Series(list(texts), dtype=object))
+    groups = pd.Series(uniques, dtype=object).str.extract(f"^{pattern}$")
+    _min = pd.to_numeric(groups["num"]).to_numpy(dtype=np.float64, copy=True)
+    _max = _min.copy()
+    types, known = get_types(groups)
+    types = types.to_numpy(dtype=object, copy=True)
+    # Long tail of texts which don't match a common pattern
+    for i in np.flatnonzero(groups["num"].isna().to_numpy() | ~known.to_numpy(dtype=bool)):
+        text_min, text_max, types[i] = function(uniques[i])
+        _min[i] = np.nan if text_min is None else text_min
+        _max[i] = np.nan if text_max is None else text_max
+    # Missing texts index the NaN added at the end
+    _min = np.append(_min, np.nan)[codes]
+    _max = np.append(_max, np.nan)[codes]
+    types = pd.Categorical(np.append(types, None)[codes])
+    return _min, _max, types
+
+def _get_unit_types(groups):
+    """
+    Gets frequency or duration types from the unit group of a pattern
+    """
+    types = groups["unit"].map(_unit_types)
+    return types, types.notna()
+
+def _get_dosage_forms(groups):
+    """
+    Gets forms from the measure or form word group of the dosage pattern.
+    A number on its own has no form.
+    """
+    forms = groups["measure"].where(groups["word"].isna(),
+                                    groups["word"].map(_get_plain_form_words()))
+    return forms, groups["word"].isna() | forms.notna()
+
+def get_dosage_info_batch(texts):
+    """
+    Get information about dosage for many dosage entity texts at once.
+    Gives the same results as di_dosage.get_dosage_info for each text.
+
+    Input:
+        texts: iterable of str
+            Dosage entity texts, with None for missing entities
+            e.g. ["2x10ml", "2-3", None, "2 tablets"]
+    Output:
+        _min: numpy.ndarray of float64
+            The minimum dosages, NaN if not known
+            e.g. [20.0, 2.0, nan, 2.0]
+        _max: numpy.ndarray of float64
+            The maximum dosages, NaN if not known
+            e.g. [20.0, 3.0, nan, 2.0]
+        form: pandas.Categorical
+            The forms of dosage if present
+            e.g. ["ml", nan, nan, "tablet"]
+    """
+    return _evaluate_batch(texts, _re_dosage, _get_dosage_forms,
+                            di_dosage.get_dosage_info)
+
+def get_frequency_info_batch(texts):
+    """
+    Get information about frequency for many frequency entity texts at
+    once. Gives the same results as di_frequency.get_frequency_info for
+    each text.
+
+    Input:
+        texts: iterable of str
+            Frequency entity texts, with None for missing entities
+            e.g. ["daily", "2 to 5 times a week", None]
+    Output:
+        _min: numpy.ndarray of float64
+            The minimum numbers of times per freqtype
+            e.g. [1.0, 2.0, nan]
+        _max: numpy.ndarray of float64
+            The maximum numbers of times per freqtype
+            e.g. [1.0, 5.0, nan]
+        freqtype: pandas.Categorical
+            The frequency types
+            e.g. ["Day", "Week", nan]
+    """
+    return _evaluate_batch(texts, _re_frequency, _get_unit_types,
+                            di_frequency.get_frequency_info)
+
+def get_duration_info_batch(texts):
+    """
+    Get information about duration for many duration entity texts at
+    once. Gives the same results as di_duration.get_duration_info for
+    each text.
+
+    Input:
+        texts: iterable of str
+            Duration entity texts, with None for missing entities
+            e.g. ["for 5 weeks", "for up to a year", None]
+    Output:
+        _min: numpy.ndarray of float64
+            The minimum durations
+            e.g. [5.0, 0.0, nan]
+        _max: numpy.ndarray of float64
+            The maximum durations
+            e.g. [5.0, 1.0, nan]
+        durtype: pandas.Categorical
+            The duration types
+            e.g. ["Week", "Year", nan]
+    """
+    return _evaluate_batch(texts, _re_duration, _get_unit_types,
+                            di_duration.get_duration_info)
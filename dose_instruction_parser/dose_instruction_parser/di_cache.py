@@ -0,0 +1,251 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import update_wrapper
+import json
+import threading
+
+from . import di_diagnostics
+
+@dataclass(frozen=True)
+class CacheInfo:
+    """
+    Statistics for an LRUCache
+
+    Attributes:
+    -----------
+    hits: int
+        Number of lookups which found a cached value
+    misses: int
+        Number of lookups which did not find a cached value
+    maxsize: int
+        Maximum number of entries held in the cache
+    currsize: int
+        Current number of entries held in the cache
+    evictions: int
+        Number of entries removed to keep the cache within maxsize
+    """
+    hits: int
+    misses: int
+    maxsize: int
+    currsize: int
+    evictions: int
+
+    @property
+    def hit_rate(self):
+        """
+        Proportion of lookups which found a cached value
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+# Returned by LRUCache.get when nothing is cached
+_MISSING = object()
+
+class LRUCache:
+    """
+    A bounded, thread-safe cache which evicts the least recently used
+    entry once it is full
+
+    Parameters:
+    -----------
+    maxsize: int
+        Maximum number of entries to hold
+    """
+    def __init__(self, maxsize=100000):
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=_MISSING):
+        """
+        Gets a value from the cache, counting a hit or miss
+
+        Input:
+            key: hashable
+                Key to look up
+            default: (_MISSING)
+                Value returned if key is not cached
+        Output:
+            The cached value, or default
+        """
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self._misses += 1
+                return default
+            self._data.move_to_end(key)
+            self._hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Adds a value to the cache, evicting the least recently used
+        entry if the cache is full
+        """
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        """
+        Removes all entries and resets statistics
+        """
+        with self._lock:
+            self._data.clear()
+            self._hits = 0
+            self._misses = 0
+            self._evictions = 0
+
+    def cache_info(self):
+        """
+        Gets statistics for the cache
+
+        Output:
+            CacheInfo
+        """
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self.maxsize,
+                                len(self._data), self._evictions)
+
+    def save(self, filepath):
+        """
+        Saves cache entries to a .json file, least recently used first.
+        Keys and values must be JSON serialisable.
+        """
+        with self._lock:
+            items = list(self._data.items())
+        with open(filepath, "w") as file:
+            json.dump(items, file)
+
+    def load(self, filepath):
+        """
+        Loads cache entries from a .json file created by LRUCache.save.
+        Loaded entries are added to any existing entries.
+        """
+        with open(filepath, "r") as file:
+            items = json.load(file)
+        for key, value in items:
+            self.put(key, value)
+
+# Default number of results held by each memoized rule function
+RULE_CACHE_SIZE = 100000
+
+# Functions memoized with memoize, by name
+_memoized = {}
+
+class _Memoized:
+    """
+    Wraps a function with an LRUCache of its results, see memoize
+    """
+    def __init__(self, function, maxsize):
+        update_wrapper(self, function)
+        self.cache = LRUCache(maxsize)
+        self.enabled = True
+        self.replay_diagnostics = False
+
+    def __call__(self, *args):
+        if not self.enabled:
+            return self.__wrapped__(*args)
+        try:
+            cached = self.cache.get(args, None)
+        except TypeError:
+            # Unhashable arguments can't be cached
+            return self.__wrapped__(*args)
+        # Diagnostics are always recorded for every call when collecting
+        replay = self.replay_diagnostics or di_diagnostics.active() is not None
+        if cached is not None:
+            result, captured = cached
+            if not replay:
+                return result
+            if captured is not None:
+                di_diagnostics.replay(captured)
+                return result
+            # Cached without its diagnostics, so find them now
+        if replay:
+            result, captured = di_diagnostics.capture(self.__wrapped__, *args)
+            di_diagnostics.replay(captured)
+        else:
+            result = self.__wrapped__(*args)
+            captured = None
+        self.cache.put(args, (result, captured))
+        return result
+
+    def __repr__(self):
+        return f"<memoized {self.__module__}.{self.__qualname__}>"
+
+def memoize(function):
+    """
+    Decorator which caches results of a rule function in an LRUCache,
+    so repeated entity texts aren't parsed again. Results must not be
+    changed by callers as they are shared.
+
+    Warnings (see di_diagnostics) from the function are only given the
+    first time it is called with an argument, unless replay_diagnostics
+    is turned on with configure_rule_caches. Diagnostics are kept with 
+    the result and recorded again for every cached result if 
+    replay_diagnostics is on or diagnostics are being collected.
+
+    Use rule_cache_info to get statistics and clear_rule_caches to empty
+    the caches.
+    """
+    memoized = _Memoized(function, RULE_CACHE_SIZE)
+    _memoized[f"{function.__module__.rsplit('.', 1)[-1]}.{function.__name__}"] = memoized
+    return memoized
+
+def configure_rule_caches(maxsize=None, enabled=None, replay_diagnostics=None):
+    """
+    Changes settings of all memoized rule functions. Settings which
+    are None are left unchanged.
+
+    Input:
+        maxsize: int (None)
+            Number of results to hold for each function. Changing this
+            empties the caches.
+        enabled: bool (None)
+            Whether to use cached results
+        replay_diagnostics: bool (None)
+            Whether to record diagnostics, e.g. warnings, again for cached
+            results. They are always recorded again while diagnostics are
+            being collected.
+    """
+    if maxsize is not None and maxsize < 1:
+        raise ValueError("maxsize must be at least 1")
+    for memoized in _memoized.values():
+        if maxsize is not None:
+            memoized.cache = LRUCache(maxsize)
+        if enabled is not None:
+            memoized.enabled = enabled
+        if replay_diagnostics is not None:
+            memoized.replay_diagnostics = replay_diagnostics
+
+def rule_cache_info():
+    """
+    Gets statistics for the cache of each memoized rule function
+
+    Output:
+        dict of str to CacheInfo
+            e.g. {"di_frequency.get_frequency_info": CacheInfo(...), ...}
+    """
+    return {name: memoized.cache.cache_info() for name, memoized in _memoized.items()}
+
+def clear_rule_caches():
+    """
+    Empties the caches of all memoized rule functions and resets statistics
+    """
+    for memoized in _memoized.values():
+        memoized.cache.clear()
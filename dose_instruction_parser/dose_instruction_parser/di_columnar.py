@@ -0,0 +1,157 @@
+from array import array
+from math import isnan
+
+from .parser import StructuredDI
+
+# StructuredDI fields stored as typed arrays of floats, with NaN for None
+FLOAT_FIELDS = ("dosageMin", "dosageMax", "frequencyMin", "frequencyMax",
+                "durationMin", "durationMax")
+
+# StructuredDI fields stored as integer codes into a list of categories,
+# with -1 for None
+CATEGORY_FIELDS = ("form", "frequencyType", "durationType")
+
+# StructuredDI fields stored as two bits each of a single byte per row:
+# whether the value is True and whether it is None
+FLAG_FIELDS = ("asRequired", "asDirected")
+
+# StructuredDI fields stored as lists
+OBJECT_FIELDS = ("inputID", "text")
+
+FIELDS = ("inputID", "text", "form", "dosageMin", "dosageMax",
+            "frequencyMin", "frequencyMax", "frequencyType",
+            "durationMin", "durationMax", "durationType",
+            "asRequired", "asDirected")
+
+class StructuredDIColumns:
+    """
+    Memory efficient container of structured dose instructions, stored
+    as one column per StructuredDI field rather than one object per row.
+
+    Behaves like a list of StructuredDI: supports append, extend, len,
+    indexing and iteration, with rows converted to StructuredDI on access.
+    Use to_dataframe to convert to a pandas DataFrame without creating
+    a StructuredDI for each row.
+    """
+    def __init__(self, structured_dis=()):
+        self._objects = {field: [] for field in OBJECT_FIELDS}
+        self._floats = {field: array("d") for field in FLOAT_FIELDS}
+        self._codes = {field: array("i") for field in CATEGORY_FIELDS}
+        self._categories = {field: {} for field in CATEGORY_FIELDS}
+        self._flags = array("B")
+        self.extend(structured_dis)
+
+    def __len__(self):
+        return len(self._flags)
+
+    def append(self, structured_di):
+        """
+        Adds a StructuredDI as a new row
+        """
+        for field, column in self._objects.items():
+            column.append(getattr(structured_di, field))
+        for field, column in self._floats.items():
+            value = getattr(structured_di, field)
+            column.append(float("nan") if value is None else value)
+        for field, column in self._codes.items():
+            value = getattr(structured_di, field)
+            if value is None:
+                column.append(-1)
+            else:
+                categories = self._categories[field]
+                column.append(categories.setdefault(value, len(categories)))
+        flags = 0
+        for i, field in enumerate(FLAG_FIELDS):
+            value = getattr(structured_di, field)
+            if value is None:
+                flags |= 2 << (2*i)
+            elif value:
+                flags |= 1 << (2*i)
+        self._flags.append(flags)
+
+    def extend(self, structured_dis):
+        """
+        Adds each StructuredDI in an iterable as a new row
+        """
+        for structured_di in structured_dis:
+            self.append(structured_di)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("StructuredDIColumns index out of range")
+        values = {field: column[index] for field, column in self._objects.items()}
+        for field, column in self._floats.items():
+            value = column[index]
+            values[field] = None if isnan(value) else value
+        for field, column in self._codes.items():
+            code = column[index]
+            values[field] = None if code == -1 else self.categories(field)[code]
+        flags = self._flags[index]
+        for i, field in enumerate(FLAG_FIELDS):
+            if flags & (2 << (2*i)):
+                values[field] = None
+            else:
+                values[field] = bool(flags & (1 << (2*i)))
+        return StructuredDI(**values)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def categories(self, field):
+        """
+        Gets the categories of a categorical field in order of their codes
+        """
+        return list(self._categories[field].keys())
+
+    def column(self, field):
+        """
+        Gets the values of a field for all rows. Float fields are returned
+        as a numpy array with NaN for None, other fields as a list.
+        """
+        if field in self._objects:
+            return list(self._objects[field])
+        elif field in self._floats:
+            import numpy as np
+            # Copied, as a view would stop the array growing on append
+            return np.array(self._floats[field], dtype=np.float64)
+        elif field in self._codes:
+            categories = self.categories(field)
+            return [None if code == -1 else categories[code]
+                        for code in self._codes[field]]
+        elif field in FLAG_FIELDS:
+            i = FLAG_FIELDS.index(field)
+            return [None if flags & (2 << (2*i)) else bool(flags & (1 << (2*i)))
+                        for flags in self._flags]
+        raise KeyError(f"Unknown field: {field}")
+
+    def to_dataframe(self):
+        """
+        Converts to a pandas DataFrame with one row per StructuredDI.
+        Float fields are float64 with NaN for None, categorical fields are
+        pandas Categoricals, and flag fields are bool unless a value is None.
+
+        Output:
+            pandas.DataFrame
+        """
+        import numpy as np
+        import pandas as pd
+        columns = {}
+        for field, column in self._objects.items():
+            columns[field] = column
+        for field, column in self._floats.items():
+            columns[field] = np.array(column, dtype=np.float64)
+        for field, column in self._codes.items():
+            columns[field] = pd.Categorical.from_codes(
+                np.array(column, dtype=np.intc), self.categories(field))
+        flags = np.array(self._flags, dtype=np.uint8)
+        for i, field in enumerate(FLAG_FIELDS):
+            values = (flags & (1 << (2*i))) > 0
+            missing = (flags & (2 << (2*i))) > 0
+            if missing.any():
+                values = values.astype(object)
+                values[missing] = None
+            columns[field] = values
+        return pd.DataFrame({field: columns[field] for field in FIELDS})
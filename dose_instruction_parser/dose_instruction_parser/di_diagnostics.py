@@ -0,0 +1,297 @@
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+import threading
+import warnings
+
+# Codes of ambiguities the rules can record, with what they mean
+CODES = {
+    "multiple_bounding_numbers": "More than one number for 'up to x' or 'at least x'",
+    "multiple_units": "More than one 'ml' or 'mg' in a range",
+    "multiple_every_numbers": "More than one number for 'every x' time units",
+    "multiple_hourly": "More than one 'hourly' or 'hrly'",
+    "hourly_number_not_found": "Could not find number before 'hourly' or 'hrly'",
+    "multiple_continuous_measures": "More than one continuous measure, e.g. 'ml' and 'mg'"
+}
+
+@dataclass(frozen=True)
+class Diagnostic:
+    """
+    An ambiguity found when parsing a dose instruction
+
+    Attributes:
+    -----------
+    code: str
+        Type of ambiguity, one of CODES
+    message: str
+        Description of the ambiguity
+    inputID: str
+        ID of the dose instruction being parsed, if known
+    text: str
+        Dose instruction being parsed, if known
+    """
+    code: str
+    message: str
+    inputID: object = None
+    text: str = None
+
+class Diagnostics:
+    """
+    Collects ambiguities found when parsing dose instructions, counting
+    them by code and keeping each one with the dose instruction it came from
+
+    Parameters:
+    -----------
+    keep_events: bool (True)
+        Whether to keep each Diagnostic. If False only counts are kept,
+        so memory use doesn't grow with the number of dose instructions.
+    """
+    def __init__(self, keep_events=True):
+        self.keep_events = keep_events
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Removes all recorded diagnostics
+        """
+        with self._lock:
+            self._counts = Counter()
+            self._events = []
+
+    def __getstate__(self):
+        # Locks can't be pickled, e.g. to return from a worker process
+        with self._lock:
+            return {"keep_events": self.keep_events, "counts": dict(self._counts),
+                    "events": list(self._events)}
+
+    def __setstate__(self, state):
+        self.keep_events = state["keep_events"]
+        self._lock = threading.Lock()
+        self._counts = Counter(state["counts"])
+        self._events = state["events"]
+
+    def add(self, code, message, input_id=None, text=None):
+        """
+        Records an ambiguity. A Diagnostic is only created if events are kept.
+        """
+        with self._lock:
+            self._counts[code] += 1
+            if self.keep_events:
+                self._events.append(Diagnostic(code, message, input_id, text))
+
+    def merge(self, other):
+        """
+        Adds the counts and diagnostics recorded by another Diagnostics,
+        e.g. from a worker process
+        """
+        with other._lock:
+            counts = Counter(other._counts)
+            events = list(other._events)
+        with self._lock:
+            self._counts.update(counts)
+            if self.keep_events:
+                self._events.extend(events)
+
+    def counts(self):
+        """
+        Gets the number of each type of ambiguity recorded
+
+        Output:
+            dict of str to int
+                e.g. {"multiple_bounding_numbers": 2}
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    def events(self, input_id=None):
+        """
+        Gets the diagnostics recorded, in the order they were found
+
+        Input:
+            input_id: (None)
+                Only get diagnostics for the dose instruction with this ID
+        Output:
+            list of Diagnostic
+        """
+        with self._lock:
+            if input_id is None:
+                return list(self._events)
+            return [event for event in self._events if event.inputID == input_id]
+
+    def summary(self):
+        """
+        Gets a short table of counts for logging
+        """
+        counts = self.counts()
+        lines = [f"Found {sum(counts.values())} ambiguities"]
+        for code, count in sorted(counts.items(), key=lambda item: -item[1]):
+            lines.append(f"{code:>30}: {count:>9}")
+        return "\n".join(lines)
+
+class _Input:
+    """
+    Context manager which sets the dose instruction being parsed, so it
+    is recorded with any diagnostics
+    """
+    __slots__ = ("value", "token")
+
+    def __init__(self, input_id, text):
+        self.value = (input_id, text)
+
+    def __enter__(self):
+        self.token = _current_input.set(self.value)
+        return self
+
+    def __exit__(self, *exc_info):
+        _current_input.reset(self.token)
+
+class _NoInput:
+    """
+    Context manager which does nothing, used when diagnostics aren't collected
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NO_INPUT = _NoInput()
+
+class _Collector:
+    """
+    Context manager which records diagnostics to a Diagnostics other
+    than the active one in the current context, see collect_into
+    """
+    __slots__ = ("diagnostics", "token")
+
+    def __init__(self, diagnostics):
+        self.diagnostics = diagnostics
+
+    def __enter__(self):
+        self.token = _collector.set(self.diagnostics)
+        return self
+
+    def __exit__(self, *exc_info):
+        _collector.reset(self.token)
+
+# Diagnostics currently collecting, or None if not collecting
+_active = None
+# Whether to give a warning for each ambiguity when not collecting
+_warn = True
+# Dose instruction currently being parsed: (inputID, text)
+_current_input = ContextVar("current_input", default=(None, None))
+# List capturing diagnostics instead of recording them, see capture
+_capture = ContextVar("capture", default=None)
+# Diagnostics collecting instead of the active one, see collect_into
+_collector = ContextVar("collector", default=None)
+
+def collect(diagnostics=None, keep_events=True):
+    """
+    Starts collecting ambiguities found by the rules instead of giving
+    warnings
+
+    Input:
+        diagnostics: Diagnostics (None)
+            Diagnostics to collect with. Default is a new Diagnostics.
+        keep_events: bool (True)
+            Whether a new Diagnostics keeps each Diagnostic or just counts
+    Output:
+        Diagnostics
+    """
+    global _active
+    _active = Diagnostics(keep_events) if diagnostics is None else diagnostics
+    return _active
+
+def warn():
+    """
+    Gives a warning for each ambiguity found by the rules. This is the default.
+    """
+    global _active, _warn
+    _active = None
+    _warn = True
+
+def ignore():
+    """
+    Neither collects nor warns about ambiguities found by the rules,
+    which is fastest for large batch runs
+    """
+    global _active, _warn
+    _active = None
+    _warn = False
+
+def active():
+    """
+    Gets the Diagnostics currently collecting in this context, or None
+    """
+    return None if _active is None else (_collector.get() or _active)
+
+def mode():
+    """
+    Gets how ambiguities are handled: "collect", "warn" or "ignore"
+    """
+    if _active is not None:
+        return "collect"
+    return "warn" if _warn else "ignore"
+
+def record(code, message):
+    """
+    Records an ambiguity found by a rule. Depending on the mode it is
+    added to the active Diagnostics, given as a warning or ignored.
+
+    Input:
+        code: str
+            Type of ambiguity, one of CODES
+        message: str
+            Description of the ambiguity
+    """
+    captured = _capture.get()
+    if captured is not None:
+        captured.append((code, message))
+    elif _active is not None:
+        (_collector.get() or _active).add(code, message, *_current_input.get())
+    elif _warn:
+        warnings.warn(message, stacklevel=2)
+
+def parsing_input(input_id, text):
+    """
+    Gets a context manager which records the dose instruction being
+    parsed with any diagnostics if collecting, and otherwise does nothing
+    """
+    return _NO_INPUT if _active is None else _Input(input_id, text)
+
+def collect_into(diagnostics):
+    """
+    Gets a context manager which, while collecting, records diagnostics 
+    in the current context to diagnostics instead of the active 
+    Diagnostics. Used to keep the diagnostics of each dose instruction
+    with its cached result. Does nothing if diagnostics is None.
+    """
+    return _NO_INPUT if diagnostics is None else _Collector(diagnostics)
+
+def capture(function, *args):
+    """
+    Calls a function, capturing the diagnostics it records instead of
+    recording them. Used to keep diagnostics with cached results.
+
+    Output:
+        result of function
+        tuple of tuple(str, str)
+            Code and message of each diagnostic captured
+    """
+    captured = []
+    token = _capture.set(captured)
+    try:
+        result = function(*args)
+    finally:
+        _capture.reset(token)
+    return result, tuple(captured)
+
+def replay(captured):
+    """
+    Records diagnostics returned by capture
+    """
+    for code, message in captured:
+        record(code, message)
@@ -1,9 +1,11 @@
-import inflect
+import csv
 import re
-import warnings
-from functools import reduce
+from functools import lru_cache, reduce
+from os import path
 
+from . import di_diagnostics
 from . import di_frequency
+from .di_cache import memoize
 
 def _is_str_float(s):
     """
@@ -43,11 +45,51 @@ def _get_form_from_dosage_tag(text):
         else:
             return splitted[1]
 
-inflect_engine = inflect.engine()
+@lru_cache(maxsize=None)
+def _get_inflect_engine():
+    """
+    Gets an inflect engine, creating it the first time it is needed
+    as importing inflect is slow
+    """
+    import inflect
+    return inflect.engine()
+
+def __getattr__(name):
+    # inflect engine is only created when first used
+    if name == "inflect_engine":
+        return _get_inflect_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Table of form words and their singular, built by build_form_table
+FORM_WORDS_FILE = path.join(path.dirname(__file__), "data", "form_words.csv")
+
+@lru_cache(maxsize=None)
+def _get_form_words():
+    """
+    Gets the table of form words and their singular, loading it the
+    first time it is needed
+
+    Output:
+        dict of str to str
+            e.g. {"tablets": "tablet", "tablet": "tablet"}
+    """
+    with open(FORM_WORDS_FILE, "r", newline="") as file:
+        return {row["Before"]: row["After"] for row in csv.DictReader(file)}
+
+@lru_cache(maxsize=10000)
+def _inflect_singular(word):
+    """
+    Converts word to singular with inflect, for words not in the table
+    of form words
+    """
+    singular = _get_inflect_engine().singular_noun(word)
+    return singular if singular else word
 
 def _to_singular(word):
     """
-    Converts word to singular if it's plural, else keeps as is
+    Converts word to singular if it's plural, else keeps as is.
+    Known form words are looked up in a table so inflect is only used
+    for other words.
 
     Input:  
         word: str  
@@ -58,8 +100,42 @@ def _to_singular(word):
             Singular version of word if available
             e.g. "tablet", "pill", "puff", "octopus"
     """
-    singular = inflect_engine.singular_noun(word)
-    return singular if singular else word
+    singular = _get_form_words().get(word)
+    return _inflect_singular(word) if singular is None else singular
+
+def build_form_table(words, filepath=None):
+    """
+    Builds the table of form words and their singular used by _to_singular,
+    adding the singular of each word. Singulars are found with inflect, so
+    looking up a word in the table gives the same result as inflect.
+
+    Input:
+        words: iterable of str
+            Form words, e.g. from keep_words.txt and FORM entities in
+            training data
+        filepath: str (None)
+            .csv file to save the table to, with columns "Before" and "After"
+    Output:
+        dict of str to str
+            e.g. {"tablet": "tablet", "tablets": "tablet"}
+    """
+    engine = _get_inflect_engine()
+    table = {}
+    for word in words:
+        word = word.strip().lower()
+        if word == "":
+            continue
+        singular = engine.singular_noun(word)
+        table[word] = singular if singular else word
+        if singular:
+            table[singular] = engine.singular_noun(singular) or singular
+    table = dict(sorted(table.items()))
+    if filepath is not None:
+        with open(filepath, "w", newline="") as file:
+            writer = csv.writer(file, lineterminator="\n")
+            writer.writerow(["Before", "After"])
+            writer.writerows(table.items())
+    return table
 
 def _get_continuous_dose(text):
     """
@@ -83,7 +159,8 @@ def _get_continuous_dose(text):
     measures = [ele for ele in ["mg", "ml"] if(ele in text)]
     if bool(measures):
         if len(measures) > 1:
-            warnings.warn("More than one type of dosage continuous measure: " + \
+            di_diagnostics.record("multiple_continuous_measures",
+                "More than one type of dosage continuous measure: " + \
                 str(measures) + \
                     ". Using " + str(measures[0]) + ".")
         form = measures[0]
@@ -105,6 +182,7 @@ def _get_continuous_dose(text):
         form = None
     return _min, _max, form
 
+@memoize
 def get_dosage_info(text):
     """ 
     Get information about dosage given a dosage entity text
@@ -1,6 +1,8 @@
 import re
 from . import di_frequency 
+from .di_cache import memoize
 
+@memoize
 def get_duration_info(text):
     """ 
     Get information about duration given a duration entity text
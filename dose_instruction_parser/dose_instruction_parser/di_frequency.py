@@ -1,7 +1,9 @@
 from dataclasses import dataclass
 from itertools import compress
 import re
-import warnings
+
+from . import di_diagnostics
+from .di_cache import memoize
 
 # Regex expression to search for numbers in text
 re_digit = r"\d*\.?\d+"
@@ -47,6 +49,103 @@ frequency_numbers = {"second": 2, "third": 3, "fourth": 4, "fifth": 5,
 freqtype_conversion = {"7 Day": "Week", "24 Hour": "Day", "48 Hour": "2 Day",
                         "14 Day": "2 Week", "4 Week" : "Month"}
 
+# Keywords which identify each frequency type, in order of priority:
+# if keywords of several types are in a frequency the first type is used
+frequency_type_keywords = {
+    "Hour": ("hour", "hr"),
+    "Week": ("week", "wk", "monday", "tuesday", "wednesday", "thursday",
+                "friday", "saturday", "sunday", "tue", "wed", "thu", "fri", "sat", "sun"),
+    "2 Week": ("fortnight",),
+    "Month": ("month", "mnth", "mon "),
+    "Year": ("year", "yr"),
+    "Day": ("day", "daily", "b/d", "bd", "night", "morning", "evening", "noon", "bedtime", "bed",
+            "breakfast", "tea", "lunch", "dinner", "meal", "nocte", "mane", "feed", "am", "pm",
+            "tds", "qds")
+}
+
+# Keywords for multiples of the frequency unit, e.g. "every 2 days"
+alternate_keywords = ("alternate", "every other")
+every_keywords = ("every", "hrly", "hourly")
+
+def _trie_regex(keywords):
+    """
+    Gets a regex matching any of keywords, written as a trie so the regex
+    engine checks each character once rather than trying every keyword
+    in turn. The longest keyword starting at a position is matched.
+
+    Inputs:
+        keywords: iterable of str
+    Outputs:
+        str
+            e.g. "(?:b(?:d|id)|qds?)" for "bd", "bid", "qd", "qds"
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[""] = None
+
+    def to_regex(node):
+        branches = [re.escape(char) + to_regex(child)
+                        for char, child in node.items() if char != ""]
+        if len(branches) == 0:
+            return ""
+        regex = "(?:" + "|".join(branches) + ")" if len(branches) > 1 else branches[0]
+        if "" in node:
+            # Keyword ends here, but may continue as a longer keyword
+            regex = regex + "?" if len(regex) == 1 else "(?:" + regex + ")?"
+        return regex
+
+    return to_regex(trie)
+
+def _build_keyword_matcher():
+    """
+    Builds a regex which finds every keyword in a frequency in one pass.
+
+    Matches are found at every position using a lookahead, so keywords
+    which overlap are all found. Only the longest keyword starting at a
+    position is matched, so each keyword is mapped to the labels of all
+    keywords it starts with, e.g. "hourly" is labelled both "every" and
+    "Hour". Latin frequency types are labelled "latin <type>".
+
+    Outputs:
+        re.Pattern, dict of str to frozenset of str
+    """
+    labels = {}
+    keywords = [(keyword, freq_type) for freq_type, keywords
+                    in frequency_type_keywords.items() for keyword in keywords]
+    keywords += [(keyword, "latin " + keyword) for keyword in latin_frequency_types]
+    keywords += [(keyword, "alternate") for keyword in alternate_keywords]
+    keywords += [(keyword, "every") for keyword in every_keywords]
+    for keyword, _ in keywords:
+        labels[keyword] = frozenset(label for prefix, label in keywords
+                                    if keyword.startswith(prefix))
+    # A number followed by "h" at the end is in hours, e.g. "4h"
+    return re.compile(rf"(?=({_trie_regex(labels)}|\dh$))"), labels
+
+_re_frequency_keywords, _frequency_keyword_labels = _build_keyword_matcher()
+_hour_labels = frozenset(("Hour",))
+
+def _find_frequency_keywords(frequency):
+    """
+    Gets the labels of all keywords in a frequency
+
+    Inputs:
+        frequency: str
+            A string for dose instruction frequency
+            e.g. "every other day"
+    Outputs:
+        set of str
+            Frequency types, "latin <type>", "alternate" and "every"
+            e.g. {"Day", "alternate", "every"}
+    """
+    found = set()
+    for keyword in _re_frequency_keywords.findall(frequency):
+        found.update(_frequency_keyword_labels.get(keyword, _hour_labels))
+    return found
+
+@memoize
 def get_frequency_type(frequency):
     """
     Gets the frequency type from a frequency string
@@ -63,36 +162,23 @@ def get_frequency_type(frequency):
     freq_type = None
     if frequency is None:
         return None
-    if any(x in frequency for x in ("hour", "hr")) | \
-        (re.search(r"\dh$", frequency) is not None):
-        freq_type = "Hour"
-    elif any(x in frequency for x in ("week", "wk", "monday",
-                                        "tuesday", "wednesday", "thursday",
-                                        "friday", "saturday", "sunday", 
-                                        "tue", "wed", "thu", "fri", "sat", "sun")):
-        freq_type = "Week"
-    elif "fortnight" in frequency:
-        freq_type = "2 Week"
-    elif any(x in frequency for x in ("month", "mnth", "mon ")):
-        freq_type = "Month"
-    elif any(x in frequency for x in ("year", "yr")):
-        freq_type = "Year"
-    elif any(x in frequency for x in
-            ("day", "daily", "b/d", "bd", "night", "morning", "evening", "noon", "bedtime", "bed",
-            "breakfast", "tea", "lunch", "dinner", "meal", "nocte", "mane", "feed", "am", "pm",
-            "tds", "qds")):
-        freq_type = "Day"
-    latin_freq = _get_latin_frequency(frequency)
-    if latin_freq:
-        freq_type = latin_freq.frequencyType
+    found = _find_frequency_keywords(frequency)
+    for keyword_type in frequency_type_keywords:
+        if keyword_type in found:
+            freq_type = keyword_type
+            break
+    for latin_freq in latin_frequency_types:
+        if "latin " + latin_freq in found:
+            freq_type = latin_frequency_types[latin_freq].frequencyType
+            break
     # Check for multiple units of frequency type e.g. every 2 days
-    freq_type = _add_frequency_multiple_units(frequency, freq_type)
+    freq_type = _add_frequency_multiple_units(frequency, freq_type, found)
     # Convert e.g. "24 Hour" -> "Day"
     if freq_type in freqtype_conversion.keys():
         freq_type = freqtype_conversion[freq_type]
     return freq_type
 
-def _add_frequency_multiple_units(frequency, freq_type):
+def _add_frequency_multiple_units(frequency, freq_type, found=None):
     """
     Checks if frequency type is for multiples of frequency unit
     e.g. "every 2 hours" or "alternate days"
@@ -105,13 +191,18 @@ def _add_frequency_multiple_units(frequency, freq_type):
         freq_type: str (None)
             Current frequency type identified
             e.g. "Hour", "Day"
+        found: set of str (None)
+            Labels of keywords in frequency from _find_frequency_keywords,
+            found if not given
     Outputs:
         freq_type with multiples added
         e.g. "6 Hour", "2 Day"
     """
-    if any(x in frequency for x in ("alternate", "every other")):
+    if found is None:
+        found = _find_frequency_keywords(frequency)
+    if "alternate" in found:
         freq_type = "2 " + freq_type 
-    if any(x in frequency for x in ("every", "hrly", "hourly")):
+    if "every" in found:
         nums = re.findall(re_digit, frequency)
         # Deal with words like third, fifth etc.
         for word in frequency.split():
@@ -120,7 +211,8 @@ def _add_frequency_multiple_units(frequency, freq_type):
         if len(nums) == 0:
             return freq_type
         if len(nums) != 1:
-            warnings.warn("More than one number for every x time unit. Using lowest unit.")
+            di_diagnostics.record("multiple_every_numbers",
+                "More than one number for every x time unit. Using lowest unit.")
         try:
             freq_type = min(nums) + " " + freq_type
         except TypeError:
@@ -166,6 +258,73 @@ def _get_number_of_times(frequency, default=None):
         else:
             return default
 
+# Words and symbols which show how to get a range from numbers in text,
+# e.g. "max 2", "1 to 2", "8am and 6pm", "2 x 5 ml"
+range_cues = {
+    "max": ("max", "upto", "up to", "Maximum"),
+    "min": ("at least", "min"),
+    "a": (" a ",),
+    "explicit": (" to ", "-", " or "),
+    "list": ("and", " / ", " ; "),
+    "time": ("am", "pm"),
+    "unit": (" x ", " ml ", " mg ")
+}
+
+def _build_range_tokeniser():
+    """
+    Builds a regex which tokenises text into numbers, latin frequency
+    types and range cues in one pass.
+
+    Latin frequency types only match as whole words, separated by any of
+    " :;-,". Range cues are found at every position using a lookahead, so
+    cues which overlap are all found. Each cue is mapped to the labels of
+    all cues it starts with. Positions which can't start a token are
+    skipped by checking the first character.
+
+    Outputs:
+        re.Pattern, dict of str to frozenset of str
+    """
+    cues = [(cue, label) for label, cues in range_cues.items() for cue in cues]
+    labels = {cue: frozenset(label for prefix, label in cues if cue.startswith(prefix))
+                for cue, _ in cues}
+    first_chars = "".join(sorted({token[0] for token in [*labels, *latin_frequency_types]}))
+    regex = (rf"(?=[\d.{re.escape(first_chars)}])"
+             rf"(?:({re_digit})"
+             rf"|(?<![^ :;\-,])({_trie_regex(latin_frequency_types)})(?![^ :;\-,])"
+             rf"|(?=({_trie_regex(labels)})))")
+    return re.compile(regex), labels
+
+_re_range_tokens, _range_cue_labels = _build_range_tokeniser()
+
+def _tokenise_range(text):
+    """
+    Gets the numbers and range cues in text
+
+    Inputs:
+        text: str
+            A dose instruction entity text
+            e.g. "1 to 2 tablets bd"
+    Outputs:
+        nums: list of float
+            Numbers in text followed by the number of times for each
+            latin frequency type
+            e.g. [1.0, 2.0, 2.0]
+        cues: set of str
+            Labels of range cues in text, from range_cues
+            e.g. {"explicit"}
+    """
+    nums = []
+    latin_nums = []
+    cues = set()
+    for number, latin, cue in _re_range_tokens.findall(text):
+        if number:
+            nums.append(float(number))
+        elif latin:
+            latin_nums.append(latin_frequency_types[latin].frequency)
+        else:
+            cues.update(_range_cue_labels[cue])
+    return nums + latin_nums, cues
+
 def _get_bounding_num(nums, bound_type):
     """
     Gets the min or max from a list of numbers. Fills in the other
@@ -193,7 +352,8 @@ def _get_bounding_num(nums, bound_type):
         return None, None
     else:
         if len(nums) > 1:
-            warnings.warn("More than one number found for bounding number")
+            di_diagnostics.record("multiple_bounding_numbers",
+                "More than one number found for bounding number")
         if bound_type == "min":
             bound = min(nums)
             return float(bound), None
@@ -201,7 +361,7 @@ def _get_bounding_num(nums, bound_type):
             bound = max(nums)
             return 0.0, float(bound)
 
-def _check_min_max_amount(text, nums):
+def _check_min_max_amount(text, nums, cues=None):
     """
     Checks whether can find a range of values using the pattern
     of "at least x" or "up to x" etc.
@@ -213,6 +373,8 @@ def _check_min_max_amount(text, nums):
             e.g. "max 4"
         nums: list of floats
             numbers identified from text
+        cues: set of str (None)
+            range cues in text from _tokenise_range, found if not given
     Output:
     -------
         _min: float (None)
@@ -222,10 +384,12 @@ def _check_min_max_amount(text, nums):
         range_found: bool
             whether range successfully found
     """
-    if any(x in text for x in ("max", "upto", "up to", "Maximum")):
+    if cues is None:
+        cues = _tokenise_range(text)[1]
+    if "max" in cues:
         _min, _max = _get_bounding_num(nums, "max")
         if _max is None:
-            if " a " in text:
+            if "a" in cues:
                 _max = 1.0
                 _min = 0.0
                 range_found = True
@@ -233,10 +397,10 @@ def _check_min_max_amount(text, nums):
                 range_found = False
         if _max is not None:
             range_found = True
-    elif any(x in text for x in ("at least", "min")):
+    elif "min" in cues:
         if len(nums) == 0:
             range_found = True
-            if (" a " in text) or text.endswith(" a"):
+            if ("a" in cues) or text.endswith(" a"):
                 _min = 1.0
                 _max = None
             else:
@@ -251,7 +415,7 @@ def _check_min_max_amount(text, nums):
         range_found = False
     return _min, _max, range_found
 
-def _check_explicit_range(text, nums):
+def _check_explicit_range(text, nums, cues=None):
     """
     Checks whether a range of numbers can be found by looking
     for an explicitly stated range using "to", "-" or "or",
@@ -264,6 +428,8 @@ def _check_explicit_range(text, nums):
             e.g. "2 to 4"
         nums: list of floats
             numbers identified from text
+        cues: set of str (None)
+            range cues in text from _tokenise_range, found if not given
     Output:
     -------
         _min: float (None)
@@ -273,7 +439,9 @@ def _check_explicit_range(text, nums):
         range_found: bool
             whether range successfully found
     """
-    if any(x in text for x in (" to ", "-", " or ")):
+    if cues is None:
+        cues = _tokenise_range(text)[1]
+    if "explicit" in cues:
         words = text.split()
         indexes = [i for i in range(len(words)) if words[i] in ("to", "-", "or")]
         try:
@@ -295,7 +463,8 @@ def _check_explicit_range(text, nums):
             mindexes = [i for i in range(len(words)) if words[i] in ("ml", "mg")]
             if len(mindexes) != 0:
                 if len(mindexes) != 1:
-                    warnings.warn("More than one instance of ('ml', 'mg') in phrase")
+                    di_diagnostics.record("multiple_units",
+                        "More than one instance of ('ml', 'mg') in phrase")
                 mindex = mindexes[0]
                 try:
                     multiplier = float(words[mindex-1])
@@ -310,7 +479,7 @@ def _check_explicit_range(text, nums):
         range_found = False
     return _min, _max, range_found
 
-def _check_range_from_list(text):
+def _check_range_from_list(text, cues=None):
     """
     Checks whether a range of numbers can be found by looking
     for a list of times
@@ -321,6 +490,8 @@ def _check_range_from_list(text):
         text: str
             text to look for pattern in 
             e.g. "8 am and 6pm" -> (2.0, 2.0, True) as this is 2 times a day
+        cues: set of str (None)
+            range cues in text from _tokenise_range, found if not given
     Output:
     -------
         _min: float (None)
@@ -330,16 +501,19 @@ def _check_range_from_list(text):
         range_found: bool
             whether range successfully found
     """
-    if any(x in text for x in ("and", " / ", " ; ")):
+    if cues is None:
+        cues = _tokenise_range(text)[1]
+    if "list" in cues:
         # Remove "/ day" or "/ d"
         text = text.replace("/ day", " ").replace("/ d", " ")
         substrs = re.split(r"and|,|\/|;", text)
-        nums = [float(_get_number_of_times(s, default=0.0)) for s in substrs]
-        if any(x in text for x in ("am", "pm")):
-            _min = float(len(nums))
-            _max = float(len(nums))
+        # Removing "/ day" can't add or remove "am" or "pm"
+        if "time" in cues:
+            _min = float(len(substrs))
+            _max = float(len(substrs))
             range_found = True
         else:
+            nums = [float(_get_number_of_times(s, default=0.0)) for s in substrs]
             num = float(sum([num for num in nums if num is not None]))
             _min = num
             _max = num
@@ -368,22 +542,19 @@ def _get_range(text, default=None):
             The maximum number of times
             e.g. None 5.0, 6.0
     """
-    nums = re.findall(re_digit, text)
-    # Check for latin frequencies
-    for word in re.split(r"[ :;\-,]", text):
-        if word in latin_frequency_types.keys():
-            nums.append(latin_frequency_types[word].frequency)
-    nums = [float(item) for item in nums]
+    # Numbers, including for latin frequencies, and range cues are
+    # found once and shared by each rule
+    nums, cues = _tokenise_range(text)
     # Initially we have not found a range to return
     # Searching for valid range using multiple rules
     range_found = False
-    _min, _max, range_found = _check_min_max_amount(text, nums)
+    _min, _max, range_found = _check_min_max_amount(text, nums, cues)
     if not range_found:
-        _min, _max, range_found = _check_explicit_range(text, nums)
+        _min, _max, range_found = _check_explicit_range(text, nums, cues)
     if not range_found:
-        _min, _max, range_found = _check_range_from_list(text)
+        _min, _max, range_found = _check_range_from_list(text, cues)
     if not range_found:
-        if len(nums) >=2 and not any(x in text for x in (" x ", " ml ", " mg ")):
+        if len(nums) >=2 and "unit" not in cues:
             _min = min(nums)
             _max = max(nums)
             range_found = True
@@ -420,7 +591,8 @@ def _get_hourly_adjusted_frequency(text):
     """
     match = re.findall("hourly|hrly", text)
     if len(match) != 1:
-        warnings.warn("More than one use of hourly/hrly, taking first instance.")
+        di_diagnostics.record("multiple_hourly",
+            "More than one use of hourly/hrly, taking first instance.")
     match = match[0]
     freqtype = get_frequency_type(text)
     words = text.split()
@@ -434,11 +606,12 @@ def _get_hourly_adjusted_frequency(text):
             else:
                 break
     except:
-        warnings.warn(f"Not in list: {words}")
+        di_diagnostics.record("hourly_number_not_found", f"Not in list: {words}")
     words = list(compress(words, remove))
     _min, _max = _get_range(" ".join(words), default=1.0)
     return _min, _max, freqtype
 
+@memoize
 def get_frequency_info(text):
     """ 
     Get information about frequency given a frequency entity text
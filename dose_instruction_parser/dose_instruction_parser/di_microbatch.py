@@ -0,0 +1,49 @@
+from dataclasses import replace
+
+# Maximum number of dose instructions sent through the model at once
+DEFAULT_MAX_BATCH_SIZE = 256
+
+# Maximum time in seconds to wait for more requests before parsing a batch
+DEFAULT_MAX_WAIT = 0.005
+
+def join_requests(batch):
+    """
+    Gets the dose instructions of a batch of requests to parse together.
+    Their input IDs are their positions in the batch, which split_results
+    uses to map parsed output back to each request.
+
+    Input:
+        batch: list of tuple(list, list, future)
+            Dose instructions, input IDs and future of each request
+    Output:
+        dis: list of str
+        rowids: list of int
+    """
+    dis = [di for request_dis, _, _ in batch for di in request_dis]
+    return dis, list(range(len(dis)))
+
+def split_results(batch, parsed_dis):
+    """
+    Splits the parsed output of a batch joined by join_requests into the
+    results of each request, with the input IDs of the request
+
+    Input:
+        batch: list of tuple(list, list, future)
+            Dose instructions, input IDs and future of each request
+        parsed_dis: list of StructuredDI
+            Parsed output with inputID the position in the batch
+    Output:
+        list of list of StructuredDI
+            Results of each request in batch order
+    """
+    outputs = [[] for request_dis, _, _ in batch for _ in request_dis]
+    for parsed_di in parsed_dis:
+        outputs[parsed_di.inputID].append(parsed_di)
+    results = []
+    position = 0
+    for request_dis, rowids, _ in batch:
+        results.append([replace(parsed_di, inputID=rowid)
+                            for i, rowid in enumerate(rowids)
+                            for parsed_di in outputs[position + i]])
+        position += len(request_dis)
+    return results
@@ -1,22 +1,138 @@
 import re
 import csv
-from spellchecker import SpellChecker
+from contextlib import contextmanager
+from functools import lru_cache
 from itertools import chain
 from word2number import w2n
 from os import path
+from types import MappingProxyType
+
+from . import di_cache
+from . import di_profile
 
 def _create_spell_checker():
     """
     Wrapper function to create a spellchecker.SpellChecker()
     Words in the keep_words.txt file will not be spellchecked
     """
+    from spellchecker import SpellChecker
     sc = SpellChecker()
     keep_words_frequency = path.join(path.dirname(__file__), 
                                         "./data/keep_words.txt")
     sc.word_frequency.load_text_file(keep_words_frequency)
     return sc
 
-spell_checker = _create_spell_checker()
+@lru_cache(maxsize=None)
+def _get_spell_checker():
+    """
+    Gets the spell checker, creating it the first time it is needed
+    as this is slow
+    """
+    return _create_spell_checker()
+
+# Corrections for misspelt words, which are expensive to compute
+spell_cache = di_cache.LRUCache(maxsize=100000)
+
+# Corrections computed while recording_corrections is used, or None
+_new_corrections = None
+
+@contextmanager
+def recording_corrections():
+    """
+    Records the spelling corrections computed inside the with block,
+    e.g. in a worker process so they can be added to spell_cache of the
+    main process
+
+    Output:
+        dict of str to str
+            Misspelt words and their corrections, filled in the block
+    """
+    global _new_corrections
+    _new_corrections = corrections = {}
+    try:
+        yield corrections
+    finally:
+        _new_corrections = None
+
+def _correct_word(word):
+    """
+    Gets the spelling correction for an unknown word, using spell_cache 
+    to avoid recomputing corrections for words already seen
+
+    Input:
+        word: str
+            A misspelt word
+            e.g. "tabletts"
+    Output:
+        str
+            Corrected word
+            e.g. "tablets"
+    """
+    corrected_word = spell_cache.get(word, None)
+    if corrected_word is None:
+        with di_profile.stage("spell_correct"):
+            corrected_word = _get_spell_checker().correction(word)
+        spell_cache.put(word, corrected_word)
+        if _new_corrections is not None:
+            _new_corrections[word] = corrected_word
+    return corrected_word
+
+def load_replace_words(replace_words_path=None):
+    """
+    Loads a table of words to replace during pre-processing
+
+    Input:
+        replace_words_path: str
+            Path to a .csv file with columns "Before" and "After".
+            Defaults to data/replace_words.csv
+    Output:
+        MappingProxyType
+            Read-only mapping of words to their replacements
+            e.g. {"amt": "amount", "bis": "twice", ...}
+    """
+    if replace_words_path is None:
+        replace_words_path = path.join(path.dirname(__file__), 
+                                        "./data/replace_words.csv")
+    replace_words = {}
+    with open(replace_words_path, newline='') as csvfile:
+        reader = csv.DictReader(csvfile)
+        for row in reader:
+            replace_words[row["Before"]] = row["After"]
+    return MappingProxyType(replace_words)
+
+def extend_replace_words(extra_words):
+    """
+    Creates a table of words to replace from the default table 
+    plus some extra words
+
+    Input:
+        extra_words: dict or str
+            Mapping of words to their replacements, or path to a .csv
+            file with columns "Before" and "After". Entries override
+            the default table where words overlap.
+    Output:
+        MappingProxyType
+            Read-only mapping of words to their replacements
+    """
+    if isinstance(extra_words, str):
+        extra_words = load_replace_words(extra_words)
+    return MappingProxyType({**_get_default_replace_words(), **extra_words})
+
+@lru_cache(maxsize=None)
+def _get_default_replace_words():
+    """
+    Gets the default table of words to replace, loading it the first 
+    time it is needed rather than for every dose instruction
+    """
+    return load_replace_words()
+
+def __getattr__(name):
+    # Resources which are only created when first used
+    if name == "spell_checker":
+        return _get_spell_checker()
+    if name == "default_replace_words":
+        return _get_default_replace_words()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 def _flatmap(func, *iterables):
     """
@@ -34,6 +150,28 @@ def _flatmap(func, *iterables):
     """
     return list(chain.from_iterable(map(func, *iterables)))
 
+# Patterns used in pre-processing, compiled once
+re_alpha_word = re.compile(r"^[a-zA-Z]+$")
+re_letter_dot = re.compile(r'(?<=[A-Za-z])\.(?=[A-Za-z])')
+re_number = re.compile(r'(\d+(\.\d+)?)')
+
+# Characters to remove or pad with spaces before splitting into words
+remove_parentheses_table = str.maketrans({"(": " ", ")": " "})
+pad_hyphens_and_slashes_table = str.maketrans({"-": " - ", "\\": " \\ ", 
+                                                "/": " / "})
+# Both of the above in one pass
+separate_words_table = {**remove_parentheses_table, 
+                        **pad_hyphens_and_slashes_table}
+
+def _correct_word_if_unknown(word):
+    """
+    Corrects the spelling of a word if it is only letters and not
+    a known word, else keeps as is
+    """
+    if not re_alpha_word.match(word) or _get_spell_checker().known([word]):
+        return word
+    return _correct_word(word)
+
 def _autocorrect(di):
     """
     Function to autocorrect a dose instruction before sending it
@@ -48,17 +186,7 @@ def _autocorrect(di):
             autocorrected dose instruction
             e.g. "2 tablets twice a day"
     """
-    di = di.lower().strip()
-    corrected_words = []
-    for word in di.split():
-        # checking if the word is only letters
-        if not re.match(r"^[a-zA-Z]+$", word) or spell_checker.known([word]):
-            corrected_words.append(word)
-        else:
-            corrected_word = spell_checker.correction(word)
-            corrected_words.append(corrected_word)
-    di = ' '.join(corrected_words)
-    return di
+    return ' '.join(_correct_word_if_unknown(word) for word in di.lower().split())
 
 def _remove_parentheses(s):
     """
@@ -73,9 +201,7 @@ def _remove_parentheses(s):
             String with parentheses removed
             e.g. "tablet s "
     """
-    s = re.sub(r'\(', r' ', s) 
-    s = re.sub(r'\)', r' ', s) 
-    return s
+    return s.translate(remove_parentheses_table)
 
 def _pad_hyphens_and_slashes(s):
     """
@@ -90,12 +216,10 @@ def _pad_hyphens_and_slashes(s):
             String with hyphens padded
             e.g. "four - six"
     """
-    s = re.sub(r'\-', r' - ', s)
-    s = re.sub(r'\\', r' \ ', s)
-    s = re.sub(r'\/', r' / ', s)
+    s = s.translate(pad_hyphens_and_slashes_table)
     # Pad . in middle of words e.g. "hello.there" -> "hello . there"
     # but don't pad e.g. "0.5" or "end. start"
-    s = re.sub(r'(?<=[A-Za-z])\.(?=[A-Za-z])', ' . ', s)
+    s = re_letter_dot.sub(' . ', s)
     return s
 
 def _pad_numbers(s):
@@ -111,8 +235,7 @@ def _pad_numbers(s):
             String with numbers padded
             e.g. " 2 x 20 ml or  3  tablets at  8 am"
     """
-    s = re.sub(r'(\d+(\.\d+)?)', r' \1 ', s)
-    return s
+    return re_number.sub(r' \1 ', s)
 
 def _convert_words_to_numbers(sentence):
     """
@@ -127,15 +250,51 @@ def _convert_words_to_numbers(sentence):
             Converted sentence
             e.g. "take 0.5 a tablet every 2 days" 
     """
-    words = sentence.split()
-    output_words = []
-    for word in words:
+    return ' '.join(_convert_word_to_number(word) for word in sentence.split())
+
+# Words for fractions and their numeric values
+fraction_words = {"half": "0.5",  "quarter": "0.25"}
+
+# Number words and the numbers w2n.word_to_num converts them to when on 
+# their own e.g. "twenty" -> "20". On its own "point" converts to "0".
+number_words = {word: ("0" if word == "point" else str(value)) 
+                for word, value in w2n.american_number_system.items()}
+
+def _convert_word_to_number(word):
+    """
+    Converts a word to a number if possible, else keeps as is. 
+    Gives the same result as converting fractions with _convert_fract_to_num
+    then converting with w2n.word_to_num, but most words are dealt with by
+    a dictionary lookup rather than w2n raising an exception.
+
+    Input:
+        word: str
+            e.g. "two", "half", "1/8", "twenty-five", "twenty five", "tablet"
+    Output:
+        str
+            e.g. "2", "0.5", "0.125", "25", "25", "tablet"
+    """
+    if word in fraction_words:
+        return fraction_words[word]
+    lower_word = word.lower()
+    if lower_word in number_words:
+        return number_words[lower_word]
+    if word.isdigit():
+        # e.g. "007" -> "7"
+        try:
+            return str(int(word))
+        except ValueError:
+            return word
+    if "/" in word:
         word = _convert_fract_to_num(word)
+    # Multi-word numerals e.g. "twenty-five" or "twenty five"
+    parts = lower_word.replace("-", " ").split()
+    if any(part in number_words for part in parts):
         try:
-            output_words.append(str(w2n.word_to_num(word)))
-        except:
-            output_words.append(word)
-    return ' '.join(output_words)
+            return str(w2n.word_to_num(word))
+        except Exception:
+            return word
+    return word
 
 def _convert_fract_to_num(word):
     """
@@ -149,12 +308,11 @@ def _convert_fract_to_num(word):
             Converted word
             e.g. "0.5"
     """
-    frac_dict = {"half": "0.5",  "quarter": "0.25"}
     def is_frac(_word):
         nums = _word.split('/')
         return len(nums) == 2 and '/' in _word and nums[0].isdigit() and nums[1].isdigit()
-    if word in frac_dict.keys():
-        out = frac_dict[word]
+    if word in fraction_words:
+        out = fraction_words[word]
     elif is_frac(word):
         num, denom = word.split('/')
         out = str(round(int(num) / int(denom), 3))
@@ -162,7 +320,7 @@ def _convert_fract_to_num(word):
         out = word
     return out
 
-def pre_process(di):
+def pre_process(di, replace_words=None):
     """
     Pre-processes a dose instruction before it is sent to the model 
 
@@ -170,39 +328,27 @@ def pre_process(di):
         di: str
             Dose instruction
             e.g. "take two tabs MORNING and nghit"
+        replace_words: Mapping (None)
+            Words to replace e.g. {"tabs": "tablets"}.
+            Defaults to the table loaded from data/replace_words.csv
     Output:
         str
             Pre-processed dose instruction
             e.g. "take 2 tablets morning and night"
     """
-    di = _remove_parentheses(di)
-    di = _pad_hyphens_and_slashes(di)
-    # get words to replace
+    # Remove parentheses, pad hyphens and slashes
+    di = di.translate(separate_words_table)
+    di = re_letter_dot.sub(' . ', di)
+    if replace_words is None:
+        replace_words = _get_default_replace_words()
+    # Split into words once then apply the remaining steps to each word:
+    # replace words, autocorrect, convert words to numbers and pad numbers.
+    # Joining and splitting on whitespace removes extra spaces.
     output_words = []
-    words = di.split()
-    replace_words = {}
-    replace_words_path = path.join(path.dirname(__file__), 
-                                    "./data/replace_words.csv")
-    with open(replace_words_path, newline='') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            replace_words[row["Before"]] = row["After"]
-    # replace words        
-    for word in words:
-        if word in replace_words.keys():
-            word = word.replace(word,replace_words[word])
-        output_words.append(word)
-    di = ' '.join(output_words)
-    # rest of preprocessing
-    di = _autocorrect(di)
-    di = _convert_words_to_numbers(di)
-    di = _pad_numbers(di)
-    # remove extra spaces between words
-    di = re.sub(r'\s+', ' ', di)
-    # remove leading and trailing whitespace
-    di = re.sub(r'\A\s+', '', di)
-    di = re.sub(r'\s+\Z', '' , di)
-    return di
-
-
-
+    for word in di.split():
+        # Replacements can be empty or contain more than one word
+        for new_word in replace_words.get(word, word).lower().split():
+            new_word = _correct_word_if_unknown(new_word)
+            new_word = _convert_word_to_number(new_word)
+            output_words.extend(re_number.sub(r' \1 ', new_word).split())
+    return ' '.join(output_words)
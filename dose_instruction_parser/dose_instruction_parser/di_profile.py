@@ -0,0 +1,311 @@
+from bisect import bisect_left
+import json
+import threading
+import time
+
+# Stages of the parse pipeline which are timed. Stages can be nested,
+# e.g. spell_correct is part of pre_process, so times don't add up to
+# the time to parse.
+STAGES = ("pre_process", "spell_correct", "model", "split_entities",
+            "dosage", "frequency", "duration")
+
+# Upper bounds in seconds of histogram buckets for stage timings
+BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+            1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0,
+            2.5, 5.0, 10.0, float("inf"))
+
+class _StageStats:
+    """
+    Count, total, min, max and histogram of timings for a stage
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float("inf")
+        self.max = 0.0
+        self.buckets = [0]*len(BUCKETS)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        """
+        Estimates a quantile as the upper bound of the bucket it falls in
+        """
+        target = q*self.count
+        cumulative = 0
+        for bound, count in zip(BUCKETS, self.buckets):
+            cumulative += count
+            if cumulative >= target:
+                return min(bound, self.max)
+        return self.max
+
+class _Timer:
+    """
+    Context manager which records the time taken in a stage
+    """
+    __slots__ = ("profiler", "stage", "start")
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record(self.stage, time.perf_counter() - self.start)
+
+class _NoTimer:
+    """
+    Context manager which does nothing, used when profiling is off
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+_NO_TIMER = _NoTimer()
+
+class _ParseTimer:
+    """
+    Context manager which records the number of dose instructions parsed
+    and the time taken
+    """
+    __slots__ = ("profiler", "n_dis", "start")
+
+    def __init__(self, profiler, n_dis):
+        self.profiler = profiler
+        self.n_dis = n_dis
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.record_parse(self.n_dis, time.perf_counter() - self.start)
+
+class Profiler:
+    """
+    Records how long each stage of the parse pipeline takes, along with
+    the number of dose instructions parsed and the time taken to parse them
+
+    Timings are recorded by wrapping code in profiler.time("stage").
+    Use report, to_json or to_prometheus to get the results.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Removes all recorded timings
+        """
+        with self._lock:
+            self._stages = {}
+            self._dose_instructions = 0
+            self._parse_seconds = 0.0
+
+    def time(self, stage):
+        """
+        Gets a context manager which records the time taken in a stage
+        """
+        return _Timer(self, stage)
+
+    def record(self, stage, seconds):
+        """
+        Records the time taken in a stage
+        """
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = _StageStats()
+            stats.add(seconds)
+
+    def record_parse(self, n_dis, seconds):
+        """
+        Records the number of dose instructions parsed by a call to
+        a DIParser method and the time it took
+        """
+        with self._lock:
+            self._dose_instructions += n_dis
+            self._parse_seconds += seconds
+
+    def report(self):
+        """
+        Gets recorded timings
+
+        Output:
+            dict
+                Number of dose instructions parsed, total time and
+                throughput, plus the count, total, mean, min, max,
+                quantiles, throughput and histogram of times for each stage
+        """
+        with self._lock:
+            stages = {}
+            # Pipeline stages in order, then any others
+            order = [stage for stage in STAGES if stage in self._stages] + \
+                    [stage for stage in self._stages if stage not in STAGES]
+            for stage in order:
+                stats = self._stages[stage]
+                stages[stage] = {
+                    "count": stats.count,
+                    "total_seconds": stats.total,
+                    "mean_seconds": stats.total / stats.count,
+                    "min_seconds": stats.min,
+                    "max_seconds": stats.max,
+                    "p50_seconds": stats.quantile(0.5),
+                    "p95_seconds": stats.quantile(0.95),
+                    "p99_seconds": stats.quantile(0.99),
+                    "per_second": stats.count / stats.total if stats.total > 0 else None,
+                    "buckets": {str(bound): count for bound, count
+                                    in zip(BUCKETS, stats.buckets)}
+                }
+            return {
+                "dose_instructions": self._dose_instructions,
+                "parse_seconds": self._parse_seconds,
+                "dose_instructions_per_second":
+                    self._dose_instructions / self._parse_seconds
+                    if self._parse_seconds > 0 else None,
+                "stages": stages
+            }
+
+    def to_json(self, filepath=None):
+        """
+        Gets the report as JSON, writing it to filepath if given
+        """
+        content = json.dumps(self.report(), indent=2)
+        if filepath is not None:
+            with open(filepath, "w") as file:
+                file.write(content)
+        return content
+
+    def to_prometheus(self, filepath=None):
+        """
+        Gets recorded timings in Prometheus text exposition format,
+        writing them to filepath if given
+        """
+        report = self.report()
+        lines = [
+            "# HELP dip_stage_seconds Time spent in each stage of parsing dose instructions",
+            "# TYPE dip_stage_seconds histogram"
+        ]
+        for stage, stats in report["stages"].items():
+            cumulative = 0
+            for bound, count in stats["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == "inf" else bound
+                lines.append(f'dip_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'dip_stage_seconds_sum{{stage="{stage}"}} {stats["total_seconds"]}')
+            lines.append(f'dip_stage_seconds_count{{stage="{stage}"}} {stats["count"]}')
+        lines += [
+            "# HELP dip_dose_instructions_total Number of dose instructions parsed",
+            "# TYPE dip_dose_instructions_total counter",
+            f"dip_dose_instructions_total {report['dose_instructions']}",
+            "# HELP dip_parse_seconds_total Time spent parsing dose instructions",
+            "# TYPE dip_parse_seconds_total counter",
+            f"dip_parse_seconds_total {report['parse_seconds']}"
+        ]
+        content = "\n".join(lines) + "\n"
+        if filepath is not None:
+            with open(filepath, "w") as file:
+                file.write(content)
+        return content
+
+    def summary(self):
+        """
+        Gets a short table of recorded timings for logging
+        """
+        report = self.report()
+        lines = [f"Parsed {report['dose_instructions']} dose instructions "
+                 f"in {report['parse_seconds']:.3f}s"]
+        for stage, stats in report["stages"].items():
+            lines.append(f"{stage:>15}: {stats['count']:>9} calls "
+                         f"{stats['total_seconds']:>9.3f}s total "
+                         f"{stats['mean_seconds']*1e3:>9.3f}ms mean "
+                         f"{stats['p95_seconds']*1e3:>9.3f}ms p95")
+        return "\n".join(lines)
+
+# Profiler currently recording timings, or None if profiling is off
+_active = None
+
+def enable(profiler=None):
+    """
+    Starts recording timings of the parse pipeline
+
+    Input:
+        profiler: Profiler (None)
+            Profiler to record timings with. Default is a new Profiler.
+    Output:
+        Profiler
+    """
+    global _active
+    _active = Profiler() if profiler is None else profiler
+    return _active
+
+def disable():
+    """
+    Stops recording timings of the parse pipeline
+    """
+    global _active
+    _active = None
+
+def active():
+    """
+    Gets the profiler currently recording timings, or None
+    """
+    return _active
+
+def stage(name):
+    """
+    Gets a context manager which records the time taken in a stage
+    if profiling is on, and otherwise does nothing
+    """
+    return _NO_TIMER if _active is None else _Timer(_active, name)
+
+def parsing(n_dis):
+    """
+    Gets a context manager which records the number of dose instructions
+    parsed and the time taken if profiling is on, and otherwise does nothing
+    """
+    return _NO_TIMER if _active is None else _ParseTimer(_active, n_dis)
+
+def timed_iter(iterable, name, batch_size=1):
+    """
+    Iterates over an iterable, recording the time taken to get each item
+    as a stage if profiling is on. Used to time lazy model output.
+
+    Items produced batch_size at a time, e.g. by spacy.Language.pipe,
+    are all charged once the batch has been iterated over. The time to
+    get the batch is shared evenly between its items rather than given
+    to the first item, which is when the batch is processed.
+    """
+    profiler = _active
+    if profiler is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        seconds = 0.0
+        batch = []
+        while len(batch) < batch_size:
+            start = time.perf_counter()
+            try:
+                batch.append(next(iterator))
+            except StopIteration:
+                break
+            finally:
+                seconds += time.perf_counter() - start
+        for _ in batch:
+            profiler.record(name, seconds / len(batch))
+        yield from batch
+        if len(batch) < batch_size:
+            return
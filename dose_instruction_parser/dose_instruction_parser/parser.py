@@ -1,9 +1,18 @@
-import spacy
-from dataclasses import dataclass
-from itertools import compress, chain
-import enlighten
-import asyncio
+from __future__ import annotations
+from dataclasses import dataclass, replace
+from itertools import compress
+from functools import partial
+from typing import TYPE_CHECKING
+import logging
 
+# spacy, enlighten and di_async (asyncio) are imported where they are used
+# so importing this module is fast
+if TYPE_CHECKING:
+    import spacy
+
+from . import di_cache
+from . import di_diagnostics
+from . import di_profile
 from . import di_prepare
 from . import di_frequency
 from . import di_dosage
@@ -45,6 +54,11 @@ class StructuredDI: # pragma: no cover
     asDirected: bool
         Whether to take as directed
     """
+    # No per-instance __dict__ as millions of these may be held at once
+    __slots__ = ("inputID", "text", "form", "dosageMin", "dosageMax", 
+                    "frequencyMin", "frequencyMax", "frequencyType", 
+                    "durationMin", "durationMax", "durationType", 
+                    "asRequired", "asDirected")
     inputID: str
     text: str
     form: str
@@ -78,7 +92,8 @@ def _get_model_entities_from_text(text, model):
     entities = model_output.ents 
     return entities
 
-def _parse_di(di: str, model: spacy.Language, input_id=None, pbar=None): 
+def _parse_di(di: str, model: spacy.Language, input_id=None, pbar=None,
+                replace_words=None): 
     """
     1. Preprocesses dose instruction
     2. Applies model to retrieve entities
@@ -87,60 +102,404 @@ def _parse_di(di: str, model: spacy.Language, input_id=None, pbar=None):
     if pbar is not None:
         pbar.update()
     try:
-        di_preprocessed = di_prepare.pre_process(di)
-        model_output = model(di_preprocessed)
+        with di_profile.stage("pre_process"):
+            di_preprocessed = di_prepare.pre_process(di, replace_words)
+        with di_profile.stage("model"):
+            model_output = model(di_preprocessed)
         return _create_structured_dis(di, model_output, input_id)
-    except Exception:
-        print(f"Error when parsing {di}: {Exception}")
-        return [StructuredDI(inputID=input_id, text=di, 
-                            form=None, dosageMin=None, dosageMax=None, 
-                            frequencyMin=None, frequencyMax=None, frequencyType=None,
-                            durationMin=None, durationMax=None, durationType=None,
-                            asRequired=None, asDirected=None)]
-
-def _parse_dis(di_lst, model: spacy.Language, rowid_lst=None): # pragma: no cover
-    """
-    Parses multiple dose instructions at once
-    """
-    # Progress bar
-    manager = enlighten.get_manager()
-    status_bar = manager.status_bar('Parsing dose instructions',
-                                color="white_on_blue",
-                                justify=enlighten.Justify.CENTER)
-    pbar = manager.counter(total=len(di_lst), desc="Parsed", unit="instructions")
+    except Exception as e:
+        logging.warning(f"Error when parsing {di}: {e!r}")
+        return [_empty_structured_di(di, input_id)]
+
+def _empty_structured_di(di, input_id=None):
+    """
+    Creates a StructuredDI with no information, used when a
+    dose instruction could not be parsed
+    """
+    return StructuredDI(inputID=input_id, text=di, 
+                        form=None, dosageMin=None, dosageMax=None, 
+                        frequencyMin=None, frequencyMax=None, frequencyType=None,
+                        durationMin=None, durationMax=None, durationType=None,
+                        asRequired=None, asDirected=None)
+
+# Number of dose instructions sent to the model at once when batching.
+# Matches [nlp] batch_size in model/config/config.cfg
+DEFAULT_BATCH_SIZE = 1000
+
+def _pre_process_many(di_lst, replace_words=None):
+    """
+    Pre-processes multiple dose instructions ready for batching.
+
+    Input:
+        di_lst: list of str
+            Dose instructions
+        replace_words: Mapping (None)
+            Words to replace during pre-processing. Defaults to the
+            table in data/replace_words.csv
+    Output:
+        list of str
+            Pre-processed dose instructions. Where pre-processing fails
+            the entry is None.
+    """
+    preprocessed = []
+    for di in di_lst:
+        try:
+            with di_profile.stage("pre_process"):
+                preprocessed.append(di_prepare.pre_process(di, replace_words))
+        except Exception as e:
+            logging.warning(f"Error when pre-processing {di}: {e!r}")
+            preprocessed.append(None)
+    return preprocessed
+
+def _parse_dis_batched(di_lst, model: spacy.Language, rowid_lst=None, 
+                        batch_size=DEFAULT_BATCH_SIZE, pbar=None,
+                        replace_words=None, preprocessed=None, out=None):
+    """
+    Parses multiple dose instructions, sending them through the model
+    in batches using spacy.Language.pipe
+
+    1. Preprocesses all dose instructions, unless already pre-processed
+       dose instructions are supplied
+    2. Applies model to batches of dose instructions to retrieve entities
+    3. Creates structured dose instructions from entities using static rules
+
+    Structured dose instructions are added to out if given, e.g. a
+    di_columnar.StructuredDIColumns, otherwise to a new list.
+    """
     rowid_lst = range(len(di_lst)) if rowid_lst is None else rowid_lst
-    parsed_dis = di_prepare._flatmap(lambda di, id: _parse_di(di, model, id, pbar), 
-                                            *(di_lst, rowid_lst))
-    status_bar.color = "white_on_green"
-    status_bar.update("Parsing complete")
+    if preprocessed is None:
+        preprocessed = _pre_process_many(di_lst, replace_words)
+    # Failed pre-processing still goes through the model so outputs
+    # stay aligned with inputs
+    model_outputs = model.pipe((text if text is not None else "" 
+                                for text in preprocessed), 
+                                batch_size=batch_size)
+    # The model runs a batch at a time as outputs are requested
+    model_outputs = di_profile.timed_iter(model_outputs, "model", batch_size)
+    parsed_dis = [] if out is None else out
+    for di, input_id, text, model_output in zip(di_lst, rowid_lst, 
+                                                preprocessed, model_outputs):
+        if pbar is not None:
+            pbar.update()
+        if text is None:
+            parsed_dis.append(_empty_structured_di(di, input_id))
+            continue
+        try:
+            parsed_dis.extend(_create_structured_dis(di, model_output, input_id))
+        except Exception as e:
+            logging.warning(f"Error when parsing {di}: {e!r}")
+            parsed_dis.append(_empty_structured_di(di, input_id))
     return parsed_dis
 
-def _parse_dis_mp(di_lst, model: spacy.Language, rowid_lst=None): # pragma: no cover
-    """
-    Parses multiple dose instructions at once in parallel (synchronous)
+# Keys which can be used to cache parsed dose instructions
+CACHE_KEYS = ("text", "preprocessed")
+
+def _parse_dis_cached(di_lst, model: spacy.Language, cache, rowid_lst=None,
+                        batch_size=DEFAULT_BATCH_SIZE, pbar=None,
+                        replace_words=None, cache_key="text", out=None):
     """
-    import multiprocessing as mp
+    Parses multiple dose instructions, reusing results for dose instructions
+    already in the cache and only sending the rest through the model.
+
+    Input:
+        di_lst: list of str
+            Dose instructions
+        model: spacy.Language
+            Model to retrieve entities
+        cache: di_cache.LRUCache
+            Cache of parsed dose instructions. Updated with new results.
+        rowid_lst: list (None)
+            Input IDs corresponding to dose instructions
+        cache_key: str; ("text", "preprocessed")
+            Whether to cache on the raw dose instruction text or on 
+            the pre-processed text. Caching on pre-processed text finds
+            more matches but still pre-processes every dose instruction.
+        out: (None)
+            Container to add results to, e.g. a di_columnar.StructuredDIColumns.
+            Default is a new list.
+    Output:
+        list of StructuredDI, or out
+            Cached results are copied with inputID and text of the input
 
+    Cached results are kept with the diagnostics found when parsing them,
+    which are recorded again for every input while diagnostics are being
+    collected. Results cached while not collecting are parsed again.
+    """
+    if cache_key not in CACHE_KEYS:
+        raise ValueError(f"cache_key must be one of: {CACHE_KEYS}")
     rowid_lst = range(len(di_lst)) if rowid_lst is None else rowid_lst
+    collecting = di_diagnostics.active() is not None
+    if cache_key == "preprocessed":
+        preprocessed = _pre_process_many(di_lst, replace_words)
+        keys = preprocessed
+    else:
+        preprocessed = None
+        keys = di_lst
+    # Look up each dose instruction, collecting distinct ones not cached
+    found = {}
+    miss_indexes = {}
+    uncacheable = []
+    for i, key in enumerate(keys):
+        if key is None:
+            # Pre-processing failed so can't be cached
+            uncacheable.append(i)
+            continue
+        value = cache.get(key, None)
+        if value is not None and (value[1] is not None or not collecting):
+            found[key] = value
+            if pbar is not None:
+                pbar.update()
+        elif key not in miss_indexes:
+            miss_indexes[key] = i
+        elif pbar is not None:
+            pbar.update()
+    # Parse the dose instructions not in cache, keeping their diagnostics
+    # to record for every input below
+    miss_lst = sorted(list(miss_indexes.values()) + uncacheable)
+    miss_diagnostics = di_diagnostics.Diagnostics() if collecting else None
+    with di_diagnostics.collect_into(miss_diagnostics):
+        parsed_misses = _parse_dis_batched(
+            [di_lst[i] for i in miss_lst], model, miss_lst, batch_size, pbar, 
+            replace_words,
+            None if preprocessed is None else [preprocessed[i] for i in miss_lst]
+        )
+    parsed = {i: ([], [] if collecting else None) for i in miss_lst}
+    for parsed_di in parsed_misses:
+        parsed[parsed_di.inputID][0].append(parsed_di)
+    if collecting:
+        for event in miss_diagnostics.events():
+            parsed[event.inputID][1].append((event.code, event.message))
+    for key, i in miss_indexes.items():
+        miss_dis, captured = parsed[i]
+        found[key] = ([replace(parsed_di, inputID=None) for parsed_di in miss_dis],
+                        None if captured is None else tuple(captured))
+        cache.put(key, found[key])
+    # Build output in input order
+    parsed_dis = [] if out is None else out
+    for i, (di, input_id, key) in enumerate(zip(di_lst, rowid_lst, keys)):
+        cached, captured = found[key] if key is not None else parsed[i]
+        if collecting:
+            with di_diagnostics.parsing_input(input_id, di):
+                di_diagnostics.replay(captured)
+        parsed_dis.extend(replace(parsed_di, inputID=input_id, text=di)
+                            for parsed_di in cached)
+    return parsed_dis
 
-    with mp.Pool(mp.cpu_count()) as p:
-        parsed_dis = p.starmap(_parse_di, [(di, model, id) for di, id in zip(di_lst, rowid_lst)])
-    # Flatten
-    parsed_dis = list(chain(*parsed_dis))
+def _parse_dis(di_lst, model: spacy.Language, rowid_lst=None, 
+                batch_size=DEFAULT_BATCH_SIZE, replace_words=None,
+                cache=None, cache_key="text", progress_bar=True,
+                columnar=False): # pragma: no cover
+    """
+    Parses multiple dose instructions at once, optionally showing 
+    a progress bar. If columnar is True results are returned as a 
+    di_columnar.StructuredDIColumns instead of a list.
+    """
+    out = None
+    if columnar:
+        from .di_columnar import StructuredDIColumns
+        out = StructuredDIColumns()
+    pbar = None
+    if progress_bar:
+        import enlighten
+        # Progress bar
+        manager = enlighten.get_manager()
+        status_bar = manager.status_bar('Parsing dose instructions',
+                                    color="white_on_blue",
+                                    justify=enlighten.Justify.CENTER)
+        pbar = manager.counter(total=len(di_lst), desc="Parsed", unit="instructions")
+    if cache is None:
+        parsed_dis = _parse_dis_batched(di_lst, model, rowid_lst, batch_size, 
+                                        pbar, replace_words, out=out)
+    else:
+        parsed_dis = _parse_dis_cached(di_lst, model, cache, rowid_lst, 
+                                        batch_size, pbar, replace_words, 
+                                        cache_key, out)
+    if progress_bar:
+        status_bar.color = "white_on_green"
+        status_bar.update("Parsing complete")
     return parsed_dis
 
-def background(f):
-    def wrapped(*args, **kwargs):
-        return asyncio.get_event_loop().run_in_executor(None, f, *args, **kwargs)
+# Number of dose instructions sent to each worker process at once
+DEFAULT_CHUNK_SIZE = 1000
+
+# Model used by a worker process, loaded once by _init_worker
+_worker_model = None
+# How a worker process handles diagnostics when not collecting them
+_worker_diagnostics_mode = "warn"
+
+def _set_worker_diagnostics_mode(): # pragma: no cover
+    if _worker_diagnostics_mode == "ignore":
+        di_diagnostics.ignore()
+    else:
+        di_diagnostics.warn()
+
+def _init_worker(model_name, diagnostics_mode="warn"): # pragma: no cover
+    """
+    Loads the model once in each worker process of the pool and handles
+    diagnostics the same way as the main process
+    """
+    import spacy
+    global _worker_model, _worker_diagnostics_mode
+    _worker_model = spacy.load(model_name)
+    _worker_diagnostics_mode = diagnostics_mode
+    _set_worker_diagnostics_mode()
+
+def _parse_chunk(chunk, batch_size=DEFAULT_BATCH_SIZE, 
+                    replace_words=None, keep_events=None): # pragma: no cover
+    """
+    Parses a chunk of dose instructions in a worker process
 
-    return wrapped
+    Input:
+        chunk: tuple(list, list)
+            Dose instructions and their corresponding input IDs
+        batch_size: int
+            Number of dose instructions sent through the model at once
+        replace_words: dict (None)
+            Words to replace during pre-processing
+        keep_events: bool (None)
+            If not None, diagnostics are collected and returned, keeping
+            each Diagnostic if True and only counts if False
+    Output:
+        list of StructuredDI
+        di_diagnostics.Diagnostics or None
+        dict of str to str
+            Spelling corrections computed for the chunk
+    """
+    di_lst, rowid_lst = chunk
+    if keep_events is None:
+        # The pool may have collected diagnostics for an earlier call
+        _set_worker_diagnostics_mode()
+        diagnostics = None
+    else:
+        diagnostics = di_diagnostics.collect(keep_events=keep_events)
+    # Workers forked inside di_diagnostics.collect_into would otherwise
+    # record to their copy of its Diagnostics
+    with di_diagnostics.collect_into(diagnostics), \
+            di_prepare.recording_corrections() as corrections:
+        parsed_dis = _parse_dis_batched(di_lst, _worker_model, rowid_lst, batch_size,
+                                        replace_words=replace_words)
+    return parsed_dis, diagnostics, corrections
 
-@background
-def _parse_di_async(di, model: spacy.Language, id): # pragma: no cover
+def _get_chunks(di_lst, rowid_lst, chunk_size):
     """
-    Parses multiple dose instructions at once in parallel (asynchronous)
+    Splits dose instructions and input IDs into chunks
+
+    Input:
+        di_lst: list of str
+            Dose instructions
+        rowid_lst: list
+            Input IDs corresponding to dose instructions
+        chunk_size: int
+            Maximum number of dose instructions in each chunk
+    Output:
+        generator of tuple(list, list)
+            Chunks of dose instructions and input IDs in input order
     """
-    return _parse_di(di, model, id)
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    for start in range(0, len(di_lst), chunk_size):
+        yield (list(di_lst[start:start+chunk_size]), 
+                list(rowid_lst[start:start+chunk_size]))
+
+def _open_pool(model_name, n_workers=None): # pragma: no cover
+    """
+    Starts a pool of worker processes which each load the model once.
+    Workers give warnings for or ignore diagnostics as the main process
+    does when the pool is started.
+
+    Output:
+        multiprocessing.pool.Pool
+    """
+    import multiprocessing as mp
+    n_workers = mp.cpu_count() if n_workers is None else n_workers
+    return mp.Pool(n_workers, initializer=_init_worker, 
+                    initargs=(model_name, di_diagnostics.mode()))
+
+def _parse_dis_mp(di_lst, model_name, rowid_lst=None, n_workers=None,
+                    chunk_size=DEFAULT_CHUNK_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                    replace_words=None, pool=None): # pragma: no cover
+    """
+    Parses multiple dose instructions at once in parallel (synchronous).
+
+    Each worker process loads the model once and is sent chunks of
+    dose instructions, so the model is never pickled per task.
+    If pool is given, e.g. from _open_pool, its workers are used and it
+    is left open so the model isn't loaded again by the next call.
+    Otherwise a pool of n_workers is started and closed for this call.
+    Output is in the same order as the input. Diagnostics collected in
+    the workers are added to the active di_diagnostics.Diagnostics, and
+    spelling corrections made in the workers to di_prepare.spell_cache.
+    """
+    rowid_lst = range(len(di_lst)) if rowid_lst is None else rowid_lst
+    # MappingProxyType can't be pickled to send to workers
+    replace_words = None if replace_words is None else dict(replace_words)
+
+    diagnostics = di_diagnostics.active()
+    keep_events = None if diagnostics is None else diagnostics.keep_events
+
+    if pool is None:
+        with _open_pool(model_name, n_workers) as pool:
+            return _parse_dis_mp(di_lst, model_name, rowid_lst, n_workers,
+                                    chunk_size, batch_size, replace_words, pool)
+    parsed_chunks = pool.imap(partial(_parse_chunk, batch_size=batch_size,
+                                        replace_words=replace_words,
+                                        keep_events=keep_events), 
+                                _get_chunks(di_lst, rowid_lst, chunk_size))
+    parsed_dis = []
+    for parsed_chunk, chunk_diagnostics, corrections in parsed_chunks:
+        parsed_dis.extend(parsed_chunk)
+        if chunk_diagnostics is not None:
+            diagnostics.merge(chunk_diagnostics)
+        # Keep corrections made in workers, e.g. to save with the CLI
+        for word, corrected_word in corrections.items():
+            di_prepare.spell_cache.put(word, corrected_word)
+    return parsed_dis
+
+def _parse_dis_deduplicated(parse_many, di_lst, rowid_lst=None):
+    """
+    Parses each distinct dose instruction once, then copies the results
+    to every input with the same dose instruction
+
+    Input:
+        parse_many: function
+            Function to parse a list of dose instructions,
+            e.g. DIParser.parse_many
+        di_lst: list of str
+            Dose instructions
+        rowid_lst: list (None)
+            Input IDs corresponding to dose instructions
+    Output:
+        list of StructuredDI
+            Parsed dose instructions in input order, with the inputID of
+            each input
+    """
+    rowid_lst = range(len(di_lst)) if rowid_lst is None else rowid_lst
+    # Position of each dose instruction in list of distinct dose instructions
+    positions = {}
+    codes = [positions.setdefault(di, len(positions)) for di in di_lst]
+    unique_dis = list(positions.keys())
+    logging.info(f"Parsing {len(unique_dis)} distinct dose instructions "
+                 f"from {len(di_lst)} inputs "
+                 f"(dedup ratio {len(unique_dis)/max(len(di_lst), 1):.3f})")
+    # Diagnostics of distinct dose instructions are recorded for every input
+    collecting = di_diagnostics.active() is not None
+    unique_diagnostics = di_diagnostics.Diagnostics() if collecting else None
+    # inputID of parsed output is the position of the distinct dose instruction
+    parsed = [[] for _ in unique_dis]
+    with di_diagnostics.collect_into(unique_diagnostics):
+        for parsed_di in parse_many(unique_dis, list(range(len(unique_dis)))):
+            parsed[parsed_di.inputID].append(parsed_di)
+    if collecting:
+        captured = [[] for _ in unique_dis]
+        for event in unique_diagnostics.events():
+            captured[event.inputID].append((event.code, event.message))
+        for code, input_id, di in zip(codes, rowid_lst, di_lst):
+            with di_diagnostics.parsing_input(input_id, di):
+                di_diagnostics.replay(captured[code])
+    parsed_dis = [replace(parsed_di, inputID=input_id) 
+                    for code, input_id in zip(codes, rowid_lst)
+                    for parsed_di in parsed[code]]
+    return parsed_dis
 
 def _split_entities_for_multiple_instructions(model_entities):
     """
@@ -287,19 +646,22 @@ def _create_structured_di(free_text, model_entities, input_id=None,
                 if form is not None:
                     structured_di.form = form
         elif label == 'DOSAGE':
-            min, max, form, = di_dosage.get_dosage_info(text)
+            with di_profile.stage("dosage"):
+                min, max, form, = di_dosage.get_dosage_info(text)
             structured_di.dosageMin = min
             structured_di.dosageMax = max
             if form is not None:
                 structured_di.form = form
         elif label == 'FREQUENCY':
-            min, max, freqtype = di_frequency.get_frequency_info(text)
+            with di_profile.stage("frequency"):
+                min, max, freqtype = di_frequency.get_frequency_info(text)
             structured_di.frequencyMin = min
             structured_di.frequencyMax = max
             if freqtype is not None:
                 structured_di.frequencyType = freqtype
         elif label == 'DURATION':
-            min, max, durtype = di_duration.get_duration_info(text)
+            with di_profile.stage("duration"):
+                min, max, durtype = di_duration.get_duration_info(text)
             structured_di.durationMin = min
             structured_di.durationMax = max
             structured_di.durationType = durtype
@@ -319,35 +681,226 @@ def _create_structured_dis(free_text, model_output, input_id=None):
     3. Creates a StructuredDI for each instruction
     """
     entities = _get_model_entities(model_output)
-    multiple_instructions = _split_entities_for_multiple_instructions(entities)
-    first_di = _create_structured_di(free_text, multiple_instructions[0], input_id)
-    # incase multiple instructions exist, they apply to the same drug and form
-    other_dis = [_create_structured_di(free_text, instruction_entities, 
-                                        first_di.inputID, 
-                                        first_di.form, first_di.asRequired,
-                                        first_di.asDirected)
-                  for instruction_entities in multiple_instructions[1:]]
+    # Diagnostics found by the rules are recorded with this dose instruction
+    with di_diagnostics.parsing_input(input_id, free_text):
+        with di_profile.stage("split_entities"):
+            multiple_instructions = _split_entities_for_multiple_instructions(entities)
+        first_di = _create_structured_di(free_text, multiple_instructions[0], input_id)
+        # incase multiple instructions exist, they apply to the same drug and form
+        other_dis = [_create_structured_di(free_text, instruction_entities, 
+                                            first_di.inputID, 
+                                            first_di.form, first_di.asRequired,
+                                            first_di.asDirected)
+                      for instruction_entities in multiple_instructions[1:]]
     return [first_di] + other_dis
 
 
 class DIParser:
     """
     Dose instruction parser class 
+
+    Parameters:
+    -----------
+    model_name: str
+        Name of installed model or path to model
+    replace_words: dict or str (None)
+        Extra words to replace during pre-processing, as a mapping
+        e.g. {"tabs": "tablets"} or the path to a .csv file with columns
+        "Before" and "After". These extend the default table in 
+        data/replace_words.csv.
+    cache_size: int (None)
+        Number of parsed dose instructions to cache. Repeated dose 
+        instructions are then returned from the cache by parse and 
+        parse_many. Least recently used results are evicted once the 
+        cache is full. Default is no caching.
+    cache_key: str; ("text", "preprocessed")
+        Whether to cache on the raw dose instruction text or on the 
+        pre-processed text
     """
-    def __init__(self, model_name):
+    def __init__(self, model_name, replace_words=None, cache_size=None,
+                    cache_key="text"):
+        if cache_key not in CACHE_KEYS:
+            raise ValueError(f"cache_key must be one of: {CACHE_KEYS}")
+        import spacy
+        self.__model_name = model_name
         self.__language = spacy.load(model_name)
+        self.__replace_words = None if replace_words is None \
+            else di_prepare.extend_replace_words(replace_words)
+        self.__cache = None if cache_size is None \
+            else di_cache.LRUCache(cache_size)
+        self.__cache_key = cache_key
+        self.__async_batcher = None
+        self.__pool = None
     def parse(self, di: str):
-        return _parse_di(di, self.__language)
-    def parse_many(self, dis: list, rowids=None):
-        return _parse_dis(dis, self.__language, rowids)
-    def parse_many_mp(self, dis: list, rowids=None):
-        return _parse_dis_mp(dis, self.__language, rowids)
+        with di_profile.parsing(1):
+            if self.__cache is None:
+                return _parse_di(di, self.__language, 
+                                    replace_words=self.__replace_words)
+            return _parse_dis_cached([di], self.__language, self.__cache, [None],
+                                        replace_words=self.__replace_words,
+                                        cache_key=self.__cache_key)
+    def parse_many(self, dis: list, rowids=None, batch_size=DEFAULT_BATCH_SIZE,
+                    progress_bar=True, columnar=False):
+        """
+        Parses multiple dose instructions, sending them through the model
+        in batches. If columnar is True results are returned as a 
+        di_columnar.StructuredDIColumns, which uses much less memory than
+        a list of StructuredDI for large numbers of dose instructions.
+        """
+        with di_profile.parsing(len(dis)):
+            return _parse_dis(dis, self.__language, rowids, batch_size, 
+                                self.__replace_words, self.__cache, self.__cache_key,
+                                progress_bar, columnar)
+    def parse_many_deduplicated(self, dis: list, rowids=None, parse_many=None):
+        """
+        Parses each distinct dose instruction once with parse_many 
+        (default DIParser.parse_many) and copies results to repeats
+        """
+        parse_many = self.parse_many if parse_many is None else parse_many
+        return _parse_dis_deduplicated(parse_many, dis, rowids)
+    def enable_profiling(self, profiler=None):
+        """
+        Starts recording how long each stage of parsing takes. Timings
+        are recorded for all parsers in this process until 
+        disable_profiling is called. Stages aren't timed in the worker 
+        processes used by parse_many_mp.
+
+        Input:
+            profiler: di_profile.Profiler (None)
+                Profiler to record timings with. Default is a new Profiler.
+        Output:
+            di_profile.Profiler
+                Use report, to_json or to_prometheus to get timings
+        """
+        return di_profile.enable(profiler)
+    def disable_profiling(self):
+        di_profile.disable()
+    def profile_report(self):
+        """
+        Recorded timings as a dict, or None if profiling is off
+        """
+        profiler = di_profile.active()
+        return None if profiler is None else profiler.report()
+    def enable_diagnostics(self, diagnostics=None, keep_events=True):
+        """
+        Starts collecting ambiguities found when parsing, e.g. more than
+        one number for "up to x", instead of giving warnings. Diagnostics
+        are collected for all parsers in this process until 
+        disable_diagnostics is called.
+
+        Input:
+            diagnostics: di_diagnostics.Diagnostics (None)
+                Diagnostics to collect with. Default is a new Diagnostics.
+            keep_events: bool (True)
+                Whether a new Diagnostics keeps each ambiguity with the
+                inputID and text of its dose instruction, or only counts
+        Output:
+            di_diagnostics.Diagnostics
+                Use counts or events to get the ambiguities found
+        """
+        return di_diagnostics.collect(diagnostics, keep_events)
+    def disable_diagnostics(self, warn=True):
+        """
+        Stops collecting ambiguities found when parsing. If warn is False
+        they are ignored entirely, which is fastest for large batch runs,
+        and otherwise a warning is given for each as by default.
+        """
+        if warn:
+            di_diagnostics.warn()
+        else:
+            di_diagnostics.ignore()
+    def diagnostics_report(self):
+        """
+        Number of each type of ambiguity found, or None if diagnostics 
+        aren't being collected
+        """
+        diagnostics = di_diagnostics.active()
+        return None if diagnostics is None else diagnostics.counts()
+    def cache_info(self):
+        """
+        Statistics for the cache of parsed dose instructions, 
+        or None if caching is off
+        """
+        return None if self.__cache is None else self.__cache.cache_info()
+    def clear_cache(self):
+        if self.__cache is not None:
+            self.__cache.clear()
+    def parse_many_mp(self, dis: list, rowids=None, n_workers=None, 
+                        chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        Parses multiple dose instructions in parallel worker processes.
+        Uses the pool started by open_pool if there is one, in which 
+        case n_workers is ignored, otherwise starts a pool for this call.
+        """
+        with di_profile.parsing(len(dis)):
+            return _parse_dis_mp(dis, self.__model_name, rowids, n_workers, 
+                                    chunk_size, replace_words=self.__replace_words,
+                                    pool=self.__pool)
+    def open_pool(self, n_workers=None):
+        """
+        Starts worker processes for parse_many_mp which are kept until
+        close_pool is called, so each worker loads the model once however
+        many times parse_many_mp is called, e.g. once per chunk of a 
+        large input file. Diagnostics are handled in the workers as set 
+        when the pool is opened.
+
+        Input:
+            n_workers: int (None)
+                Number of worker processes. Default is the number of CPUs.
+        """
+        if self.__pool is None:
+            self.__pool = _open_pool(self.__model_name, n_workers)
+    def close_pool(self):
+        """
+        Stops the worker processes started by open_pool
+        """
+        if self.__pool is not None:
+            self.__pool.close()
+            self.__pool.join()
+            self.__pool = None
+    def configure_async(self, max_batch_size=None, max_wait=None, 
+                            max_concurrency=None, executor=None):
+        """
+        Sets up how aparse, aparse_many and aparse_stream batch dose 
+        instructions. See di_async.AsyncMicroBatcher for arguments.
+        Arguments left as None use the defaults in di_async.
+        """
+        from . import di_async
+        options = {"max_batch_size": max_batch_size, "max_wait": max_wait,
+                    "max_concurrency": max_concurrency}
+        self.__async_batcher = di_async.AsyncMicroBatcher(
+            partial(self.parse_many, progress_bar=False), executor=executor,
+            **{k: v for k, v in options.items() if v is not None}
+        )
+        return self.__async_batcher
+    def _get_async_batcher(self):
+        if self.__async_batcher is None:
+            return self.configure_async()
+        return self.__async_batcher
+    async def aparse(self, di: str, input_id=None):
+        """
+        Parses a dose instruction without blocking the event loop. 
+        Concurrent calls are parsed together in batches.
+        """
+        return await self._get_async_batcher().submit([di], [input_id])
+    async def aparse_many(self, dis: list, rowids=None):
+        """
+        Parses multiple dose instructions without blocking the event loop
+        """
+        return await self._get_async_batcher().submit(dis, rowids)
+    async def aparse_stream(self, dis, rowids=None):
+        """
+        Parses an iterable or async iterable of dose instructions, 
+        yielding StructuredDIs in input order as they are parsed
+        """
+        from . import di_async
+        async for parsed_di in di_async.parse_stream(self._get_async_batcher(), 
+                                                        dis, rowids):
+            yield parsed_di
     def parse_many_async(self, dis: list, rowids=None):
-        rowids = range(len(dis)) if rowids is None else rowids
-        loop = asyncio.get_event_loop()
-        looper = asyncio.gather(*[_parse_di_async(di, self.__language, rowid) for di, rowid in zip(dis, rowids)],
-                                    return_exceptions = False)
-        results = loop.run_until_complete(looper)
-        results = [r for sublist in results for r in sublist]
-        loop.close()
-        return results
+        """
+        Parses multiple dose instructions with aparse_many from 
+        synchronous code. Use aparse_many inside a running event loop.
+        """
+        import asyncio
+        return asyncio.run(self.aparse_many(dis, rowids))
@@ -0,0 +1,219 @@
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import asdict
+from os import path, remove
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+
+from .di_microbatch import (
+    DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT, join_requests, split_results
+)
+
+class MicroBatcher:
+    """
+    Collects dose instructions from concurrent requests into batches
+    which are parsed together in a background thread
+
+    Parameters:
+    -----------
+    parse_many: function
+        Function to parse a list of dose instructions with input IDs,
+        e.g. DIParser.parse_many
+    max_batch_size: int
+        Maximum number of dose instructions in a batch. A single request
+        with more dose instructions than this is parsed as one batch.
+    max_wait: float
+        Maximum time in seconds to wait for more requests before parsing
+    """
+    def __init__(self, parse_many, max_batch_size=DEFAULT_MAX_BATCH_SIZE,
+                    max_wait=DEFAULT_MAX_WAIT):
+        self.parse_many = parse_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, dis, rowids=None):
+        """
+        Adds dose instructions to the next batch
+
+        Input:
+            dis: list of str
+                Dose instructions
+            rowids: list (None)
+                Input IDs corresponding to dose instructions
+        Output:
+            concurrent.futures.Future
+                Resolves to a list of StructuredDI for these dose instructions
+        """
+        rowids = list(range(len(dis))) if rowids is None else list(rowids)
+        future = Future()
+        self._queue.put((list(dis), rowids, future))
+        return future
+
+    def close(self):
+        """
+        Stops the background thread once queued requests are parsed
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            request = self._queue.get()
+            if request is None:
+                break
+            batch = [request]
+            size = len(request[0])
+            deadline = time.monotonic() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if request is None:
+                    stopping = True
+                    break
+                batch.append(request)
+                size += len(request[0])
+            self._parse_batch(batch)
+
+    def _parse_batch(self, batch):
+        """
+        Parses a batch of requests and sets the result of each request
+        """
+        try:
+            results = split_results(batch, self.parse_many(*join_requests(batch)))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+class ParseRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles requests to the parse server
+
+    GET /health
+        Returns {"status": "ok"}
+    POST /parse
+        Takes either {"di": "...", "inputID": ...} for a single dose
+        instruction or {"dis": [...], "inputIDs": [...]} for several,
+        with inputID(s) optional. Returns {"results": [...]} with one
+        entry per StructuredDI.
+    """
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        else:
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/parse":
+            self._send_json(404, {"error": f"Unknown path: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length))
+            if "di" in body:
+                dis = [body["di"]]
+                rowids = [body.get("inputID")]
+            else:
+                dis = body["dis"]
+                rowids = body.get("inputIDs")
+            assert isinstance(dis, list), "'dis' must be a list"
+            assert rowids is None or len(rowids) == len(dis), \
+                "'inputIDs' must be the same length as 'dis'"
+        except (ValueError, KeyError, TypeError, AssertionError) as e:
+            self._send_json(400, {"error": f"Invalid request: {e}"})
+            return
+        try:
+            parsed_dis = self.server.batcher.submit(dis, rowids).result()
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {"results": [asdict(di) for di in parsed_dis]})
+
+    def _send_json(self, status, content):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "unix-socket"
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} {format % args}")
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    """
+    HTTP server listening on a Unix domain socket
+    """
+    daemon_threads = True
+
+def make_server(dip, host="127.0.0.1", port=8000, socket_path=None,
+                max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait=DEFAULT_MAX_WAIT):
+    """
+    Creates a server which parses dose instructions with an already
+    loaded parser
+
+    Input:
+        dip: DIParser
+            Parser to use for all requests
+        host: str
+            Host to listen on for HTTP
+        port: int
+            Port to listen on for HTTP. Use 0 to pick a free port.
+        socket_path: str (None)
+            Path of a Unix domain socket to listen on instead of host and port
+        max_batch_size: int
+            Maximum number of dose instructions sent through the model at once
+        max_wait: float
+            Maximum time in seconds to wait for more requests before parsing
+    Output:
+        socketserver.BaseServer
+            Call serve_forever() to start handling requests
+    """
+    if socket_path is None:
+        server = ThreadingHTTPServer((host, port), ParseRequestHandler)
+    else:
+        server = ThreadingUnixHTTPServer(socket_path, ParseRequestHandler)
+    server.batcher = MicroBatcher(
+        lambda dis, rowids: dip.parse_many(dis, rowids, progress_bar=False),
+        max_batch_size, max_wait
+    )
+    return server
+
+def serve(dip, host="127.0.0.1", port=8000, socket_path=None, **kwargs): # pragma: no cover
+    """
+    Runs a parse server until interrupted. See make_server for arguments.
+    """
+    server = make_server(dip, host, port, socket_path, **kwargs)
+    address = socket_path if socket_path is not None \
+        else f"http://{server.server_address[0]}:{server.server_address[1]}"
+    logging.info(f"Serving dose instruction parser on {address}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopping server")
+    finally:
+        server.server_close()
+        server.batcher.close()
+        if socket_path is not None and path.exists(socket_path):
+            remove(socket_path)
@@ -1,3 +1,6 @@
+import time
+from dataclasses import dataclass
+
 import pytest
 from spacy import load
 
@@ -54,3 +57,23 @@ OUTPUT_DIS_SMALL = [
         asRequired=True, asDirected=False
     ),
 ]
+
+@dataclass
+class FakeParsedDI:
+    inputID: object
+    text: str
+
+class FakeParser:
+    """
+    Stands in for DIParser so batching and the server can be tested 
+    without a model. Splits dose instructions on "then" like multiple 
+    instructions, taking delay seconds to parse each batch.
+    """
+    def __init__(self, delay=0):
+        self.batches = []
+        self.delay = delay
+    def parse_many(self, dis, rowids=None, progress_bar=True):
+        self.batches.append(list(dis))
+        time.sleep(self.delay)
+        return [FakeParsedDI(rowid, part) for di, rowid in zip(dis, rowids)
+                    for part in di.split(" then ")]
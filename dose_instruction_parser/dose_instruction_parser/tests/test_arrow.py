@@ -0,0 +1,58 @@
+import pytest
+from dose_instruction_parser import di_columnar
+from dose_instruction_parser.parser import _empty_structured_di
+from dose_instruction_parser.tests.conftest import OUTPUT_DIS_SMALL
+
+pa = pytest.importorskip("pyarrow")
+from dose_instruction_parser import di_arrow
+
+def _read(outfile):
+    if outfile.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.read_table(outfile), pq.ParquetFile(outfile).num_row_groups
+    import pyarrow.ipc
+    reader = pa.ipc.open_file(outfile)
+    return reader.read_all(), reader.num_record_batches
+
+@pytest.mark.parametrize("fext", [".parquet", ".arrow"])
+@pytest.mark.parametrize("columnar", [False, True])
+def test_arrow_writer(tmp_path, fext, columnar):
+    outfile = str(tmp_path / f"out{fext}")
+    chunks = [list(OUTPUT_DIS_SMALL[:2]), 
+              list(OUTPUT_DIS_SMALL[2:]) + [_empty_structured_di("unparsable", 99)]]
+    with di_arrow.ArrowWriter(outfile) as writer:
+        for chunk in chunks:
+            writer.write(di_columnar.StructuredDIColumns(chunk) if columnar else chunk)
+    table, n_groups = _read(outfile)
+    assert n_groups == len(chunks), "Each write not a separate row group"
+    rows = table.to_pylist()
+    expected = [{field: getattr(di, field) for field in di_columnar.FIELDS}
+                    for chunk in chunks for di in chunk]
+    assert rows == expected, "Rows read back don't match structured dose instructions"
+    assert table.schema.field("dosageMin").type == pa.float64()
+    assert table.schema.field("asRequired").type == pa.bool_()
+    assert pa.types.is_dictionary(table.schema.field("form").type)
+    assert table.schema.field("inputID").type == pa.int64()
+
+def test_arrow_writer_input_id_types(tmp_path):
+    outfile = str(tmp_path / "out.parquet")
+    with di_arrow.ArrowWriter(outfile) as writer:
+        writer.write([_empty_structured_di("a", "A1"), _empty_structured_di("b", None)])
+        writer.write([_empty_structured_di("c", 2), _empty_structured_di("d", float("nan"))])
+    table, _ = _read(outfile)
+    assert table.column("inputID").to_pylist() == ["A1", None, "2", None], \
+        "Later input IDs not converted to string"
+    with pytest.raises(ValueError, match="inputID"):
+        with di_arrow.ArrowWriter(str(tmp_path / "out2.parquet")) as writer:
+            writer.write([_empty_structured_di("a", 1)])
+            writer.write([_empty_structured_di("b", "A1")])
+
+def test_arrow_writer_empty(tmp_path):
+    outfile = str(tmp_path / "out.parquet")
+    di_arrow.ArrowWriter(outfile).close()
+    table, _ = _read(outfile)
+    assert table.num_rows == 0 and table.column_names == list(di_columnar.FIELDS)
+
+def test_arrow_writer_extension(tmp_path):
+    with pytest.raises(ValueError):
+        di_arrow.ArrowWriter(str(tmp_path / "out.csv"))
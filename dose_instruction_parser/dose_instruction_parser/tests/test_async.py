@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from dose_instruction_parser import di_async
+from dose_instruction_parser.tests.conftest import FakeParsedDI, FakeParser
+
+def test_async_micro_batcher():
+    dip = FakeParser()
+    batcher = di_async.AsyncMicroBatcher(dip.parse_many, max_wait=0.05)
+    async def main():
+        return await asyncio.gather(batcher.submit(["a then b"], ["x"]), 
+                                    batcher.submit(["c", "d"]))
+    results = asyncio.run(main())
+    assert results == [[FakeParsedDI("x", "a"), FakeParsedDI("x", "b")],
+                       [FakeParsedDI(0, "c"), FakeParsedDI(1, "d")]], \
+        "Micro-batched results not mapped back to requests"
+    assert dip.batches == [["a then b", "c", "d"]], \
+        "Requests not combined into one batch"
+
+def test_async_micro_batcher_new_loop():
+    dip = FakeParser()
+    batcher = di_async.AsyncMicroBatcher(dip.parse_many)
+    for _ in range(2):
+        result = asyncio.run(batcher.submit(["a"]))
+        assert result == [FakeParsedDI(0, "a")], \
+            "Batcher not usable from a new event loop"
+
+def test_async_micro_batcher_error():
+    def parse_many(dis, rowids):
+        raise RuntimeError("model failed")
+    batcher = di_async.AsyncMicroBatcher(parse_many)
+    with pytest.raises(RuntimeError, match="model failed"):
+        asyncio.run(batcher.submit(["a"]))
+
+def test_async_micro_batcher_max_batch_size():
+    dip = FakeParser()
+    batcher = di_async.AsyncMicroBatcher(dip.parse_many, max_batch_size=2, 
+                                            max_wait=0.05)
+    async def main():
+        return await asyncio.gather(*[batcher.submit([di]) for di in "abcde"])
+    asyncio.run(main())
+    assert dip.batches == [["a", "b"], ["c", "d"], ["e"]], \
+        "Batches not limited to max_batch_size"
+
+def test_async_micro_batcher_max_concurrency():
+    with pytest.raises(ValueError):
+        di_async.AsyncMicroBatcher(FakeParser().parse_many, max_concurrency=0)
+    dip = FakeParser()
+    batcher = di_async.AsyncMicroBatcher(dip.parse_many, max_concurrency=2, 
+                                            max_wait=0.05)
+    async def main():
+        return await asyncio.gather(*[batcher.submit([di]) for di in "abcde"])
+    asyncio.run(main())
+    assert max(len(batch) for batch in dip.batches) <= 2, \
+        "More requests in flight than max_concurrency"
+
+def test_async_event_loop_not_blocked():
+    dip = FakeParser(delay=0.2)
+    batcher = di_async.AsyncMicroBatcher(dip.parse_many)
+    async def main():
+        ticks = 0
+        task = asyncio.ensure_future(batcher.submit(["a"]))
+        while not task.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks
+    assert asyncio.run(main()) > 5, "Event loop blocked while parsing"
+
+@pytest.mark.parametrize("sync_input", [True, False])
+def test_parse_stream(sync_input):
+    dip = FakeParser()
+    batcher = di_async.AsyncMicroBatcher(dip.parse_many, max_batch_size=3)
+    dis = ["a then b", "c", "d", "e then f", "g"]
+    async def agen():
+        for di in dis:
+            yield di
+    async def main():
+        stream = di_async.parse_stream(batcher, dis if sync_input else agen(),
+                                        rowids=range(10, 15))
+        return [parsed_di async for parsed_di in stream]
+    results = asyncio.run(main())
+    assert [(di.inputID, di.text) for di in results] == \
+        [(10, "a"), (10, "b"), (11, "c"), (12, "d"), (13, "e"), (13, "f"), (14, "g")], \
+        "Streamed results not in input order"
+    assert max(len(batch) for batch in dip.batches) > 1, \
+        "Streamed dose instructions not batched"
@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+from dose_instruction_parser import di_batch, di_dosage, di_duration, di_frequency
+
+DOSAGES = ["2", "0.5", "5ml", "10 mg", "2 tablets", "1 puff", "2 bd", "2x10ml",
+            "1-2", "up to 4", "1 or 2", "2 octopodes", "max 4 tabs"]
+FREQUENCIES = ["2 times a day", "3 times daily", "1 time per week", "4 times a month",
+                "daily", "bd", "every 4 hours", "2 to 5 times a week", "6 hrly"]
+DURATIONS = ["for 5 days", "2 weeks", "for 1 year", "for 3 months", "for 1.5 days",
+                "for up to a year", "for 2 - 3 months", "for 1 fortnight"]
+
+def _to_tuples(_min, _max, types):
+    return [(None if math.isnan(x) else x, None if math.isnan(y) else y,
+                None if pd.isna(t) else t) for x, y, t in zip(_min, _max, types)]
+
+@pytest.mark.parametrize("batch_function, function, texts", [
+    (di_batch.get_dosage_info_batch, di_dosage.get_dosage_info, DOSAGES),
+    (di_batch.get_frequency_info_batch, di_frequency.get_frequency_info, FREQUENCIES),
+    (di_batch.get_duration_info_batch, di_duration.get_duration_info, DURATIONS)
+])
+def test_batch_matches_scalar(batch_function, function, texts):
+    texts = texts + texts[::-1] + [None]
+    _min, _max, types = batch_function(texts)
+    assert _min.dtype == np.float64 and _max.dtype == np.float64, \
+        "Min and max not float arrays"
+    assert isinstance(types, pd.Categorical), "Types not categorical"
+    expected = [function(text) for text in texts[:-1]] + [(None, None, None)]
+    assert _to_tuples(_min, _max, types) == expected, \
+        "Batch output doesn't match scalar function"
+
+def test_batch_series_with_missing():
+    texts = pd.Series(["2 tablets", np.nan, "2 tablets", None])
+    _min, _max, form = di_batch.get_dosage_info_batch(texts)
+    assert _to_tuples(_min, _max, form) == \
+        [(2.0, 2.0, "tablet"), (None, None, None), (2.0, 2.0, "tablet"), (None, None, None)]
+    assert list(form.categories) == ["tablet"]
+
+def test_batch_empty():
+    _min, _max, types = di_batch.get_frequency_info_batch([])
+    assert len(_min) == len(_max) == len(types) == 0
+
+def test_plain_form_words():
+    words = di_batch._get_plain_form_words()
+    assert words["tablets"] == "tablet" and words["puffs"] == "puff"
+    assert "bd" not in words and "and" not in words, \
+        "Form words with range cues or latin frequencies used in dosage pattern"
+
+@pytest.mark.parametrize("batch_function, function, text", [
+    (di_batch.get_dosage_info_batch, di_dosage.get_dosage_info, "٣ tablets"),
+    (di_batch.get_frequency_info_batch, di_frequency.get_frequency_info, "٢ times a day"),
+    (di_batch.get_duration_info_batch, di_duration.get_duration_info, "for ٥ days")
+])
+def test_batch_non_ascii_digits(batch_function, function, text):
+    texts = [text, "2 tablets"]
+    assert _to_tuples(*batch_function(texts)) == [function(text) for text in texts], \
+        "Non-ASCII digits not passed to scalar function"
@@ -0,0 +1,84 @@
+import pytest
+from dose_instruction_parser import di_cache
+
+def test_lru_cache_eviction():
+    cache = di_cache.LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert "b" not in cache and "a" in cache and "c" in cache, \
+        "Least recently used entry not evicted"
+    assert cache.get("b", None) is None
+    info = cache.cache_info()
+    assert (info.hits, info.misses, info.currsize, info.evictions) == (1, 1, 2, 1), \
+        f"Cache statistics not as expected: {info}"
+    assert info.hit_rate == 0.5
+
+def test_lru_cache_maxsize():
+    with pytest.raises(ValueError):
+        di_cache.LRUCache(maxsize=0)
+
+def test_lru_cache_save_load(tmp_path):
+    filepath = tmp_path / "cache.json"
+    cache = di_cache.LRUCache(maxsize=3)
+    for key, value in (("tabletts", "tablets"), ("dya", "day")):
+        cache.put(key, value)
+    cache.save(filepath)
+    new_cache = di_cache.LRUCache(maxsize=3)
+    new_cache.load(filepath)
+    assert new_cache.get("tabletts") == "tablets" and new_cache.get("dya") == "day", \
+        "Cache not loaded correctly"
+
+def test_lru_cache_clear():
+    cache = di_cache.LRUCache()
+    cache.put("a", 1)
+    cache.get("a")
+    cache.clear()
+    assert len(cache) == 0 and cache.cache_info().hits == 0, \
+        "Cache not cleared"
+
+@pytest.fixture
+def rule_caches():
+    di_cache.clear_rule_caches()
+    yield
+    di_cache.configure_rule_caches(maxsize=di_cache.RULE_CACHE_SIZE, enabled=True,
+                                    replay_diagnostics=False)
+
+def test_memoize_rule_functions(rule_caches):
+    from dose_instruction_parser import di_frequency
+    result = di_frequency.get_frequency_info("2 to 5 times a week")
+    assert di_frequency.get_frequency_info("2 to 5 times a week") == result
+    info = di_cache.rule_cache_info()["di_frequency.get_frequency_info"]
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1), \
+        f"Cache statistics not as expected: {info}"
+    assert set(di_cache.rule_cache_info()) == {
+        "di_frequency.get_frequency_type", "di_frequency.get_frequency_info",
+        "di_dosage.get_dosage_info", "di_duration.get_duration_info"}
+
+def test_memoize_warnings(rule_caches, recwarn):
+    from dose_instruction_parser import di_frequency
+    import warnings
+    warnings.simplefilter("always")
+    di_frequency.get_frequency_type("every 2 or 3 days")
+    di_frequency.get_frequency_type("every 2 or 3 days")
+    assert len(recwarn) == 1, "Warning given again for cached result"
+    di_cache.configure_rule_caches(replay_diagnostics=True)
+    recwarn.clear()
+    assert di_frequency.get_frequency_type("every 2 or 3 days") == "2 Day"
+    assert di_frequency.get_frequency_type("every 2 or 3 days") == "2 Day"
+    assert len(recwarn) == 2, "Warning not replayed for cached result"
+
+def test_configure_rule_caches(rule_caches):
+    from dose_instruction_parser import di_duration
+    di_cache.configure_rule_caches(enabled=False)
+    di_duration.get_duration_info("for 5 days")
+    assert di_cache.rule_cache_info()["di_duration.get_duration_info"].misses == 0, \
+        "Disabled cache used"
+    di_cache.configure_rule_caches(maxsize=1, enabled=True)
+    for text in ("for 5 days", "for 2 weeks", "for 5 days"):
+        di_duration.get_duration_info(text)
+    info = di_cache.rule_cache_info()["di_duration.get_duration_info"]
+    assert (info.maxsize, info.currsize, info.evictions) == (1, 1, 2)
+    with pytest.raises(ValueError):
+        di_cache.configure_rule_caches(maxsize=0)
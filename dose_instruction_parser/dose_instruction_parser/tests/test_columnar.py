@@ -0,0 +1,53 @@
+import pickle
+
+import pandas as pd
+import pytest
+from dose_instruction_parser import di_columnar
+from dose_instruction_parser.parser import _empty_structured_di
+from dose_instruction_parser.tests.conftest import OUTPUT_DIS_SMALL
+
+def test_structured_di_slots():
+    di = OUTPUT_DIS_SMALL[0]
+    assert not hasattr(di, "__dict__"), "StructuredDI has a per-instance __dict__"
+    assert pickle.loads(pickle.dumps(di)) == di, "StructuredDI can't be pickled"
+
+def test_columns_round_trip():
+    dis = list(OUTPUT_DIS_SMALL) + [_empty_structured_di("unparsable", 99)]
+    columns = di_columnar.StructuredDIColumns(dis)
+    assert len(columns) == len(dis)
+    assert list(columns) == dis, "Rows not converted back to StructuredDI"
+    assert columns[-1] == dis[-1]
+    with pytest.raises(IndexError):
+        columns[len(dis)]
+
+def test_columns_categories():
+    columns = di_columnar.StructuredDIColumns(OUTPUT_DIS_SMALL)
+    assert columns.categories("frequencyType") == ["Day"], \
+        "Repeated categories not stored once"
+
+@pytest.mark.parametrize("dis", [
+    OUTPUT_DIS_SMALL, 
+    list(OUTPUT_DIS_SMALL) + [_empty_structured_di("unparsable", 99)]
+])
+def test_columns_to_dataframe(dis):
+    df = di_columnar.StructuredDIColumns(dis).to_dataframe()
+    expected = pd.DataFrame(dis)
+    assert df.columns.tolist() == expected.columns.tolist(), \
+        "DataFrame columns not in StructuredDI field order"
+    assert df.astype(object).where(df.notna(), None).values.tolist() == \
+        expected.astype(object).where(expected.notna(), None).values.tolist(), \
+        "DataFrame values don't match DataFrame of StructuredDI"
+
+def test_columns_to_dataframe_dtypes():
+    df = di_columnar.StructuredDIColumns(OUTPUT_DIS_SMALL).to_dataframe()
+    assert df["dosageMin"].dtype == "float64"
+    assert isinstance(df["form"].dtype, pd.CategoricalDtype)
+    assert df["asRequired"].dtype == bool
+
+def test_columns_append_after_column():
+    columns = di_columnar.StructuredDIColumns(OUTPUT_DIS_SMALL[:1])
+    dosage_min = columns.column("dosageMin")
+    df = columns.to_dataframe()
+    columns.append(OUTPUT_DIS_SMALL[1])
+    assert len(columns) == 2, "Row not appended while a column is held"
+    assert len(dosage_min) == len(df) == 1
@@ -0,0 +1,117 @@
+import pytest
+from dose_instruction_parser import di_diagnostics, di_cache, di_frequency, di_dosage
+
+@pytest.fixture(autouse=True)
+def reset_diagnostics():
+    di_cache.configure_rule_caches(enabled=False)
+    yield
+    di_diagnostics.warn()
+    di_cache.configure_rule_caches(enabled=True)
+
+def test_record_warns_by_default():
+    with pytest.warns(UserWarning, match="More than one number found for bounding number"):
+        di_frequency._get_bounding_num(["2", "3"], "max")
+
+def test_collect():
+    diagnostics = di_diagnostics.collect()
+    with di_diagnostics.parsing_input("id1", "up to 2 or 3 tablets"):
+        di_frequency._get_bounding_num(["2", "3"], "max")
+    di_dosage._get_continuous_dose("5 ml or 10 mg")
+    assert diagnostics.counts() == {"multiple_bounding_numbers": 1,
+                                    "multiple_continuous_measures": 1}
+    events = diagnostics.events("id1")
+    assert len(events) == 1 and events[0].code == "multiple_bounding_numbers" \
+        and events[0].text == "up to 2 or 3 tablets", \
+        f"Diagnostic not recorded with dose instruction: {events}"
+    assert all(event.code in di_diagnostics.CODES for event in diagnostics.events())
+
+def test_collect_counts_only():
+    diagnostics = di_diagnostics.collect(keep_events=False)
+    di_frequency._get_bounding_num(["2", "3"], "min")
+    di_frequency._get_bounding_num(["2", "3"], "min")
+    assert diagnostics.counts() == {"multiple_bounding_numbers": 2}
+    assert diagnostics.events() == []
+
+def test_ignore(recwarn):
+    di_diagnostics.ignore()
+    assert di_diagnostics.mode() == "ignore"
+    di_frequency._get_bounding_num(["2", "3"], "max")
+    assert len(recwarn) == 0, "Warning given when diagnostics ignored"
+
+def test_merge():
+    diagnostics = di_diagnostics.Diagnostics()
+    other = di_diagnostics.Diagnostics()
+    other.add("multiple_units", "message", 1, "text")
+    diagnostics.merge(other)
+    diagnostics.merge(other)
+    assert diagnostics.counts() == {"multiple_units": 2} and len(diagnostics.events()) == 2
+
+def test_capture_and_replay():
+    diagnostics = di_diagnostics.collect()
+    result, captured = di_diagnostics.capture(di_frequency._get_bounding_num, ["2", "3"], "max")
+    assert result == (0.0, 3.0) and diagnostics.counts() == {}
+    assert [code for code, _ in captured] == ["multiple_bounding_numbers"]
+    di_diagnostics.replay(captured)
+    assert diagnostics.counts() == {"multiple_bounding_numbers": 1}
+
+def test_replay_cached_diagnostics(recwarn):
+    di_cache.configure_rule_caches(enabled=True)
+    di_cache.clear_rule_caches()
+    # Cached while giving warnings, so without its diagnostics
+    di_frequency.get_frequency_type("every 2 or 3 days")
+    diagnostics = di_diagnostics.collect()
+    for _ in range(3):
+        di_frequency.get_frequency_type("every 2 or 3 days")
+    assert diagnostics.counts() == {"multiple_every_numbers": 3}, \
+        "Diagnostics not recorded for every cached result while collecting"
+    di_diagnostics.warn()
+    recwarn.clear()
+    di_frequency.get_frequency_type("every 2 or 3 days")
+    assert len(recwarn) == 0, "Warning given again for cached result"
+
+def test_collect_into():
+    diagnostics = di_diagnostics.collect()
+    other = di_diagnostics.Diagnostics()
+    with di_diagnostics.collect_into(other):
+        assert di_diagnostics.active() is other
+        di_frequency._get_bounding_num(["2", "3"], "max")
+    di_frequency._get_bounding_num(["2", "3"], "max")
+    assert other.counts() == {"multiple_bounding_numbers": 1}
+    assert diagnostics.counts() == {"multiple_bounding_numbers": 1}
+    with di_diagnostics.collect_into(None):
+        assert di_diagnostics.active() is diagnostics
+
+@pytest.fixture(scope="module")
+def ruler_model():
+    # Stands in for a trained model so no model needs to be installed
+    import spacy
+    model = spacy.blank("en")
+    model.add_pipe("entity_ruler").add_patterns([
+        {"label": "DOSAGE", "pattern": [{"LIKE_NUM": True}, {"LOWER": "tablets"}]},
+        {"label": "FREQUENCY", "pattern": [{"LOWER": "every"}, {"LIKE_NUM": True}, 
+            {"TEXT": "-"}, {"LIKE_NUM": True}, {"LOWER": "hours"}]}
+    ])
+    return model
+
+@pytest.mark.parametrize("cached", [False, True])
+def test_parse_repeated_inputs(ruler_model, cached):
+    from dose_instruction_parser import parser
+    di_cache.configure_rule_caches(enabled=True)
+    dis = ["take 2 tablets every 4 - 6 hours"] * 5
+    rowids = [f"id{i}" for i in range(len(dis))]
+    cache = di_cache.LRUCache(10) if cached else None
+    def parse_many(dis, rowids):
+        if cache is None:
+            return parser._parse_dis_batched(dis, ruler_model, rowids)
+        return parser._parse_dis_cached(dis, ruler_model, cache, rowids)
+    # Rule and result caches are filled before collecting
+    parse_many(dis, rowids)
+    diagnostics = di_diagnostics.collect()
+    for _ in range(2):
+        parse_many(dis, rowids)
+    parser._parse_dis_deduplicated(parse_many, dis, rowids)
+    assert diagnostics.counts() == {"multiple_every_numbers": 3*len(dis)}, \
+        "Diagnostics not counted once for every input"
+    assert [event.inputID for event in diagnostics.events()] == rowids*3, \
+        "Diagnostics not recorded with input IDs"
+    assert all(event.text == dis[0] for event in diagnostics.events())
@@ -31,6 +31,20 @@ def test_to_singular(before, after):
     assert di_dosage._to_singular(before) == after, \
         f"to_singular failed: {before} should correct to {after}"
 
+def test_form_words_match_inflect():
+    engine = di_dosage._get_inflect_engine()
+    for before, after in di_dosage._get_form_words().items():
+        assert after == (engine.singular_noun(before) or before), \
+            f"Form words table doesn't match inflect for {before}"
+
+def test_build_form_table(tmp_path):
+    filepath = tmp_path / "form_words.csv"
+    table = di_dosage.build_form_table(["tablet", "Puffs", ""], filepath)
+    assert table == {"puff": "puff", "puffs": "puff", "tablet": "tablet"}, \
+        "Form words table not built as expected"
+    assert filepath.read_text() == "Before,After\npuff,puff\npuffs,puff\ntablet,tablet\n", \
+        "Form words table not saved as expected"
+
 
 @pytest.mark.parametrize("before, after", [
     ("3 5 ml spoonfuls", (15.0, 15.0, "ml")),
@@ -23,12 +23,28 @@ def test_get_latin_frequency(before, after):
     ("wk", "Week"),
     ("with breakfast", "Day"),
     ("on mon", None),
-    ("qid", "Day")
+    ("qid", "Day"),
+    ("bd for 1 week", "Day"),
+    ("every 4h", "4 Hour"),
+    ("on tuesday", "Week"),
+    ("every 24 hours", "Day")
 ])
 def test_get_frequency_type(before, after):
     assert di_frequency.get_frequency_type(before) == after, \
         f"get_frequency_type failed: {before} should retun {after}"
 
+@pytest.mark.parametrize("before, after", [
+    ("five tablets", set()),
+    ("hourly", {"Hour", "every"}),
+    ("on tuesday", {"Week", "Day"}),
+    ("every other day", {"Day", "alternate", "every"}),
+    ("qds", {"Day", "latin qd", "latin qds"}),
+    ("every 4h", {"Hour", "every"})
+])
+def test_find_frequency_keywords(before, after):
+    assert di_frequency._find_frequency_keywords(before) == after, \
+        f"_find_frequency_keywords failed: {before} should retun {after}"
+
 @pytest.mark.parametrize("before_1, before_2, after", [
     ("every 6 hours", "Hour", "6 Hour"), 
     ("alternate days", "Day", "2 Day"),
@@ -118,4 +134,17 @@ def test_get_frequency_info(before, after):
 ])      
 def test_check_range_from_list(before, after):
     assert di_frequency._check_range_from_list(before) == after, \
-        f"_check_range_from_list failed: {before} should return {after}"
\ No newline at end of file
+        f"_check_range_from_list failed: {before} should return {after}"
+
+@pytest.mark.parametrize("before, after", [
+    ("daily", ([], set())),
+    ("1 to 2 tablets", ([1.0, 2.0], {"explicit"})),
+    ("0.5-1 bd", ([0.5, 1.0, 2.0], {"explicit"})),
+    ("max qds", ([4.0], {"max"})),
+    ("8 am and 6pm", ([8.0, 6.0], {"list", "time"})),
+    ("2 x 5 ml spoons", ([2.0, 5.0], {"unit"})),
+    ("bds", ([], set()))
+])
+def test_tokenise_range(before, after):
+    assert di_frequency._tokenise_range(before) == after, \
+        f"_tokenise_range failed: {before} should return {after}"
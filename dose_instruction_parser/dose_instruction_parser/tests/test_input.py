@@ -0,0 +1,110 @@
+import gzip
+
+import pandas as pd
+import pytest
+from dose_instruction_parser.__main__ import (
+    get_input_format, read_in, read_in_chunks, check_setup,
+    save_checkpoint, resume_from_checkpoint
+)
+
+DIS = ["take one tablet daily", "two puffs prn", "1 bd", "4 caplets tid", "as dir"]
+ROWIDS = ["a", "b", "c", "d", "e"]
+
+def _write_input(tmp_path, fname, columns=("inputID", "di")):
+    infile = str(tmp_path / fname)
+    df = pd.DataFrame({columns[0]: ROWIDS, columns[1]: DIS, "other": 1})
+    if ".parquet" in fname or ".arrow" in fname:
+        pa = pytest.importorskip("pyarrow")
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if fname.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            pq.write_table(table, infile, row_group_size=2)
+        else:
+            import pyarrow.ipc
+            with pa.ipc.new_file(infile, table.schema) as writer:
+                for batch in table.to_batches(max_chunksize=3):
+                    writer.write_batch(batch)
+    elif ".csv" in fname:
+        df.to_csv(infile, index=False)
+    else:
+        with gzip.open(infile, "wt") if fname.endswith(".gz") else open(infile, "w") as file:
+            file.write("\n".join(DIS))
+    return infile
+
+@pytest.mark.parametrize("infile, expected", [
+    ("dis.txt", (".txt", None)),
+    ("dis.csv.gz", (".csv", "gzip")),
+    ("dis.txt.zst", (".txt", "zstd")),
+    ("path.to/dis.parquet", (".parquet", None))
+])
+def test_get_input_format(infile, expected):
+    assert get_input_format(infile) == expected
+
+def test_check_setup_compression(tmp_path):
+    with pytest.raises(AssertionError):
+        check_setup(str(tmp_path / "dis.parquet.gz"), None)
+
+@pytest.mark.parametrize("fname", ["dis.csv", "dis.csv.gz", "dis.parquet", "dis.arrow"])
+def test_read_in(tmp_path, fname):
+    infile = _write_input(tmp_path, fname, ("id", "text"))
+    ifext = get_input_format(infile)[0]
+    assert read_in(infile, ifext, ("id", "text")) == (DIS, ROWIDS), \
+        f"Dose instructions not read from {fname}"
+    chunks = list(read_in_chunks(infile, ifext, 2, ("id", "text")))
+    assert chunks == [(DIS[:2], ROWIDS[:2]), (DIS[2:4], ROWIDS[2:4]), (DIS[4:], ROWIDS[4:])], \
+        f"Dose instructions not read from {fname} in chunks"
+
+@pytest.mark.parametrize("fname", ["dis.txt", "dis.txt.gz"])
+def test_read_in_txt(tmp_path, fname):
+    infile = _write_input(tmp_path, fname)
+    assert read_in(infile, ".txt") == (DIS, None)
+    chunks = list(read_in_chunks(infile, ".txt", 3))
+    assert chunks == [(DIS[:3], [0, 1, 2]), (DIS[3:], [3, 4])]
+
+@pytest.mark.parametrize("fname", ["dis.csv", "dis.parquet"])
+def test_read_in_missing_columns(tmp_path, fname):
+    infile = _write_input(tmp_path, fname)
+    ifext = get_input_format(infile)[0]
+    with pytest.raises((ValueError, AssertionError)):
+        read_in(infile, ifext, ("id", "text"))
+
+def test_resume_from_checkpoint(tmp_path):
+    infile = _write_input(tmp_path, "dis.txt")
+    outfile = tmp_path / "out.txt"
+    checkpoint = str(outfile) + ".checkpoint"
+    outfile.write_text("chunk 0")
+    save_checkpoint(checkpoint, infile, 2, 1, str(outfile))
+    with open(outfile, "a") as file:
+        file.write(" partly written chunk 1")
+    assert resume_from_checkpoint(checkpoint, infile, 2, str(outfile)) == 1
+    assert outfile.read_text() == "chunk 0", "Partly written chunk not removed"
+    with pytest.raises(AssertionError):
+        resume_from_checkpoint(checkpoint, infile, 3, str(outfile))
+
+def test_resume_from_checkpoint_changed_input(tmp_path):
+    infile = _write_input(tmp_path, "dis.txt")
+    outfile = tmp_path / "out.txt"
+    checkpoint = str(outfile) + ".checkpoint"
+    outfile.write_text("chunk 0")
+    save_checkpoint(checkpoint, infile, 2, 1, str(outfile))
+    with open(infile, "a") as file:
+        file.write("\nappended dose instruction")
+    with pytest.raises(AssertionError, match="has changed"):
+        resume_from_checkpoint(checkpoint, infile, 2, str(outfile))
+
+def test_read_in_chunks_mixed_ids_to_parquet(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    from dose_instruction_parser.di_arrow import ArrowWriter
+    from dose_instruction_parser.parser import _empty_structured_di
+    # Types of IDs found from the first chunk only would be int
+    rowids = [str(i) for i in range(60)] + [f"A{i}" for i in range(40)]
+    infile = str(tmp_path / "dis.csv")
+    pd.DataFrame({"inputID": rowids, "di": "1 tab daily"}).to_csv(infile, index=False)
+    outfile = str(tmp_path / "out.parquet")
+    with ArrowWriter(outfile) as writer:
+        for dis, chunk_rowids in read_in_chunks(infile, ".csv", 50):
+            writer.write([_empty_structured_di(di, rowid) 
+                            for di, rowid in zip(dis, chunk_rowids)])
+    assert pq.read_table(outfile).column("inputID").to_pylist() == rowids, \
+        "Input IDs of different types across chunks not written"
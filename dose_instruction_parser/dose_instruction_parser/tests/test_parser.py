@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from spacy import load
 
@@ -19,6 +20,108 @@ def test_parser():
     assert parsed_dis == OUTPUT_DIS_SMALL, \
         "Test output doesn't match expected"
 
+@pytest.mark.parametrize("batch_size", [1, 2, 1000])
+def test_parser_batch_size(batch_size):
+    p = parser.DIParser(DEFAULT_MODEL_NAME)
+    parsed_dis = p.parse_many(DIS_SMALL, batch_size=batch_size)
+    assert parsed_dis == OUTPUT_DIS_SMALL, \
+        f"Test output doesn't match expected for batch size {batch_size}"
+
+def test_parse_dis_batched_rowids():
+    rowids = [f"id{i}" for i in range(len(DIS_SMALL))]
+    parsed_dis = parser._parse_dis_batched(DIS_SMALL, DEFAULT_MODEL, rowids)
+    assert [di.inputID for di in parsed_dis] == rowids, \
+        "Input IDs not carried through batched parsing"
+
+def test_parser_mp():
+    p = parser.DIParser(DEFAULT_MODEL_NAME)
+    parsed_dis = p.parse_many_mp(DIS_SMALL, n_workers=2, chunk_size=1)
+    assert parsed_dis == OUTPUT_DIS_SMALL, \
+        "Multiprocessing output doesn't match expected"
+
+def test_parser_mp_pool():
+    p = parser.DIParser(DEFAULT_MODEL_NAME)
+    p.open_pool(2)
+    try:
+        pids = sorted(worker.pid for worker in p._DIParser__pool._pool)
+        for _ in range(2):
+            parsed_dis = p.parse_many_mp(DIS_SMALL, chunk_size=1)
+            assert parsed_dis == OUTPUT_DIS_SMALL, \
+                "Multiprocessing output with kept pool doesn't match expected"
+        assert sorted(worker.pid for worker in p._DIParser__pool._pool) == pids, \
+            "Worker processes not kept between calls"
+    finally:
+        p.close_pool()
+
+def test_parser_async():
+    p = parser.DIParser(DEFAULT_MODEL_NAME)
+    assert p.parse_many_async(DIS_SMALL) == OUTPUT_DIS_SMALL, \
+        "Async output doesn't match expected"
+    async def main():
+        parsed = await asyncio.gather(*[p.aparse(di, i)
+                                        for i, di in enumerate(DIS_SMALL)])
+        streamed = [parsed_di async for parsed_di in p.aparse_stream(DIS_SMALL)]
+        return [parsed_di for dis in parsed for parsed_di in dis], streamed
+    parsed, streamed = asyncio.run(main())
+    assert parsed == OUTPUT_DIS_SMALL, "aparse output doesn't match expected"
+    assert streamed == OUTPUT_DIS_SMALL, "aparse_stream output doesn't match expected"
+
+def test_parser_columnar():
+    p = parser.DIParser(DEFAULT_MODEL_NAME)
+    parsed_dis = p.parse_many(DIS_SMALL, columnar=True)
+    assert list(parsed_dis) == OUTPUT_DIS_SMALL, \
+        "Columnar output doesn't match expected"
+
+def test_parser_profiling():
+    p = parser.DIParser(DEFAULT_MODEL_NAME)
+    profiler = p.enable_profiling()
+    try:
+        p.parse_many(DIS_SMALL)
+        report = p.profile_report()
+    finally:
+        p.disable_profiling()
+    assert report["dose_instructions"] == len(DIS_SMALL)
+    for stage in ("pre_process", "model", "split_entities", "dosage", "frequency"):
+        assert report["stages"][stage]["count"] > 0, f"Stage {stage} not timed"
+    assert p.profile_report() is None
+
+def test_parser_diagnostics():
+    p = parser.DIParser(DEFAULT_MODEL_NAME)
+    diagnostics = p.enable_diagnostics()
+    try:
+        parsed_dis = p.parse_many(DIS_SMALL)
+        report = p.diagnostics_report()
+    finally:
+        p.disable_diagnostics()
+    assert parsed_dis == OUTPUT_DIS_SMALL, \
+        "Output with diagnostics collected doesn't match expected"
+    assert report == diagnostics.counts()
+    assert all(event.inputID in range(len(DIS_SMALL)) for event in diagnostics.events()), \
+        "Diagnostics not recorded with input IDs"
+    assert p.diagnostics_report() is None
+
+@pytest.mark.parametrize("cache_key", ["text", "preprocessed"])
+def test_parser_cache(cache_key):
+    p = parser.DIParser(DEFAULT_MODEL_NAME, cache_size=10, cache_key=cache_key)
+    p.parse_many(DIS_SMALL)
+    parsed_dis = p.parse_many(DIS_SMALL)
+    assert parsed_dis == OUTPUT_DIS_SMALL, \
+        "Cached output doesn't match expected"
+    info = p.cache_info()
+    assert (info.hits, info.misses) == (len(DIS_SMALL), len(DIS_SMALL)), \
+        f"Cache statistics not as expected: {info}"
+    parsed_di = p.parse(DIS_SMALL[0])
+    assert parsed_di[0].inputID is None and parsed_di[0].text == DIS_SMALL[0], \
+        "Cached output doesn't have input ID substituted"
+
+def test_parser_deduplicated():
+    p = parser.DIParser(DEFAULT_MODEL_NAME)
+    dis = DIS_SMALL + DIS_SMALL[::-1]
+    rowids = list(range(len(dis)))
+    parsed_dis = p.parse_many_deduplicated(dis, rowids)
+    assert parsed_dis == p.parse_many(dis, rowids), \
+        "Deduplicated output doesn't match expected"
+
 def test_get_model_entities():
     model_output = DEFAULT_MODEL("take 2 tablets daily")
     ents = parser._get_model_entities(model_output)
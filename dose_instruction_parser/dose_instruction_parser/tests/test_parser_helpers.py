@@ -0,0 +1,39 @@
+import pytest
+from dose_instruction_parser import parser
+
+# Parser tests which don't need the en_edris9 model, so unlike 
+# test_parser.py they run in GitHub actions
+
+class BrokenModel:
+    """
+    Stands in for a model, giving output without entities
+    """
+    def __call__(self, text):
+        return object()
+
+    def pipe(self, texts, batch_size=None):
+        return (self(text) for text in texts)
+
+def test_pre_process_many_logs_errors(caplog):
+    preprocessed = parser._pre_process_many(["take 2 tablets daily", None])
+    assert preprocessed[1] is None, "Failed pre-processing not marked as None"
+    assert "Error when pre-processing None" in caplog.text \
+        and "<class 'Exception'>" not in caplog.text, \
+        "Pre-processing error not logged"
+
+def test_get_chunks():
+    chunks = list(parser._get_chunks(["a", "b", "c"], [0, 1, 2], 2))
+    assert chunks == [(["a", "b"], [0, 1]), (["c"], [2])], \
+        "Chunks not split as expected"
+
+@pytest.mark.parametrize("parse", [
+    lambda di: parser._parse_di(di, BrokenModel(), "id1"),
+    lambda di: parser._parse_dis_batched([di], BrokenModel(), ["id1"])
+])
+def test_parse_logs_errors(parse, caplog, capsys):
+    parsed_dis = parse("take 2 tablets daily")
+    assert parsed_dis == [parser._empty_structured_di("take 2 tablets daily", "id1")], \
+        "Failed parsing not returned as empty structured dose instruction"
+    assert "Error when parsing take 2 tablets daily: AttributeError(" in caplog.text, \
+        "Parsing error not logged"
+    assert capsys.readouterr().out == "", "Parsing error printed"
@@ -61,4 +61,59 @@ def test_convert_fract_to_num(start, end):
 ])
 def test_pre_process(start, end):
     assert di_prepare.pre_process(start) == end, \
-        "Pre-processing yields incorrect result"
\ No newline at end of file
+        "Pre-processing yields incorrect result"
+
+def test_load_replace_words():
+    replace_words = di_prepare.load_replace_words()
+    assert replace_words["tabs"] == "tablets", \
+        "Replace words table not loaded correctly"
+    with pytest.raises(TypeError):
+        replace_words["tabs"] = "tabs"
+
+def test_extend_replace_words(tmp_path):
+    csv_path = tmp_path / "extra_words.csv"
+    csv_path.write_text("Before,After\npf,puff\ntabs,tablet\n")
+    for extra_words in ({"pf": "puff", "tabs": "tablet"}, str(csv_path)):
+        replace_words = di_prepare.extend_replace_words(extra_words)
+        assert replace_words["pf"] == "puff" and replace_words["tabs"] == "tablet" \
+            and replace_words["amt"] == "amount", \
+            "Replace words table not extended correctly"
+
+def test_pre_process_custom_replace_words():
+    replace_words = di_prepare.extend_replace_words({"pf": "puff"})
+    assert di_prepare.pre_process("two pf daily", replace_words) == "2 puff daily", \
+        "Pre-processing with custom replace words yields incorrect result"
+
+def test_correct_word_cached():
+    di_prepare.spell_cache.clear()
+    assert di_prepare._correct_word("tabletts") == "tablets"
+    assert di_prepare._correct_word("tabletts") == "tablets"
+    info = di_prepare.spell_cache.cache_info()
+    assert (info.hits, info.misses) == (1, 1), \
+        "Spelling correction not cached"
+
+def test_recording_corrections():
+    di_prepare.spell_cache.clear()
+    di_prepare._correct_word("tabletts")
+    with di_prepare.recording_corrections() as corrections:
+        di_prepare._correct_word("tabletts")
+        di_prepare._correct_word("dayly")
+    di_prepare._correct_word("capsuls")
+    assert corrections == {"dayly": "daily"}, \
+        "Only corrections computed in the block not recorded"
+
+@pytest.mark.parametrize("start, end", [
+    ("two", "2"),
+    ("Twenty", "20"),
+    ("half", "0.5"),
+    ("1/8", "0.125"),
+    ("007", "7"),
+    ("0.5", "0.5"),
+    ("tablet", "tablet"),
+    ("twenty-five", "25"),
+    ("twenty five", "25"),
+    ("point", "0")
+])
+def test_convert_word_to_number(start, end):
+    assert di_prepare._convert_word_to_number(start) == end, \
+        "Converting word to number failed"
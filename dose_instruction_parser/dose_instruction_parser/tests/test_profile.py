@@ -0,0 +1,72 @@
+import json
+import time
+
+import pytest
+from dose_instruction_parser import di_profile
+
+@pytest.fixture
+def profiler():
+    profiler = di_profile.enable()
+    yield profiler
+    di_profile.disable()
+
+def test_profiler_report():
+    profiler = di_profile.Profiler()
+    for seconds in (0.001, 0.002, 0.003, 0.1):
+        profiler.record("model", seconds)
+    profiler.record_parse(4, 0.2)
+    report = profiler.report()
+    stats = report["stages"]["model"]
+    assert stats["count"] == 4 and stats["total_seconds"] == pytest.approx(0.106)
+    assert (stats["min_seconds"], stats["max_seconds"]) == (0.001, 0.1)
+    assert stats["p50_seconds"] == 0.0025, "Median not estimated from histogram"
+    assert stats["p99_seconds"] == 0.1, "Quantile not capped at maximum"
+    assert sum(stats["buckets"].values()) == 4
+    assert report["dose_instructions_per_second"] == pytest.approx(20)
+    assert json.loads(profiler.to_json()) == report
+
+def test_profiler_stage_order():
+    profiler = di_profile.Profiler()
+    for stage in ("other", "duration", "pre_process"):
+        profiler.record(stage, 0.001)
+    assert list(profiler.report()["stages"]) == ["pre_process", "duration", "other"], \
+        "Stages not reported in pipeline order"
+
+def test_profiler_prometheus():
+    profiler = di_profile.Profiler()
+    profiler.record("dosage", 3e-5)
+    profiler.record("dosage", 0.2)
+    lines = profiler.to_prometheus().splitlines()
+    assert 'dip_stage_seconds_bucket{stage="dosage",le="5e-05"} 1' in lines
+    assert 'dip_stage_seconds_bucket{stage="dosage",le="+Inf"} 2' in lines
+    assert 'dip_stage_seconds_count{stage="dosage"} 2' in lines
+    assert "dip_dose_instructions_total 0" in lines
+
+def test_stage_disabled():
+    di_profile.disable()
+    with di_profile.stage("model"), di_profile.parsing(1):
+        pass
+    assert di_profile.active() is None
+
+def test_stage_enabled(profiler):
+    with di_profile.parsing(3):
+        with di_profile.stage("model"):
+            pass
+        assert list(di_profile.timed_iter(range(3), "model")) == [0, 1, 2]
+    report = profiler.report()
+    assert report["stages"]["model"]["count"] == 4, \
+        "Not one timing per item plus one per stage"
+    assert report["dose_instructions"] == 3
+
+def test_timed_iter_batches(profiler):
+    def batched_output():
+        # Like spacy.Language.pipe, the whole batch is processed when 
+        # its first item is requested
+        for batch in ([0, 1, 2], [3, 4]):
+            time.sleep(0.03)
+            yield from batch
+    assert list(di_profile.timed_iter(batched_output(), "model", 3)) == [0, 1, 2, 3, 4]
+    stats = profiler.report()["stages"]["model"]
+    assert stats["count"] == 5, "Not one timing per item"
+    assert stats["min_seconds"] >= 0.005, \
+        "Batch time not shared between items of the batch"
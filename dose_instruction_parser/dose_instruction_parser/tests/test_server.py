@@ -0,0 +1,65 @@
+import json
+import threading
+from urllib import request
+from urllib.error import HTTPError
+
+import pytest
+from dose_instruction_parser import server
+from dose_instruction_parser.tests.conftest import FakeParsedDI, FakeParser
+
+@pytest.fixture
+def running_server():
+    dip = FakeParser()
+    srv = server.make_server(dip, port=0, max_wait=0.05)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv, dip
+    srv.shutdown()
+    srv.server_close()
+    srv.batcher.close()
+
+def _post(srv, content, path="/parse"):
+    host, port = srv.server_address
+    req = request.Request(f"http://{host}:{port}{path}", 
+                            data=json.dumps(content).encode(), method="POST")
+    with request.urlopen(req) as response:
+        return json.loads(response.read())
+
+def test_micro_batcher():
+    dip = FakeParser()
+    batcher = server.MicroBatcher(dip.parse_many, max_wait=0.05)
+    futures = [batcher.submit(["a then b"], ["x"]), batcher.submit(["c", "d"])]
+    results = [future.result() for future in futures]
+    batcher.close()
+    assert results == [[FakeParsedDI("x", "a"), FakeParsedDI("x", "b")],
+                       [FakeParsedDI(0, "c"), FakeParsedDI(1, "d")]], \
+        "Micro-batched results not mapped back to requests"
+    assert dip.batches == [["a then b", "c", "d"]], \
+        "Requests not combined into one batch"
+
+def test_micro_batcher_error():
+    def parse_many(dis, rowids):
+        raise RuntimeError("model failed")
+    batcher = server.MicroBatcher(parse_many)
+    future = batcher.submit(["a"])
+    with pytest.raises(RuntimeError):
+        future.result()
+    batcher.close()
+
+def test_server_parse(running_server):
+    srv, dip = running_server
+    single = _post(srv, {"di": "one tablet daily", "inputID": "id1"})
+    assert single == {"results": [{"inputID": "id1", "text": "one tablet daily"}]}
+    many = _post(srv, {"dis": ["a", "b then c"]})
+    assert many == {"results": [{"inputID": 0, "text": "a"},
+                                {"inputID": 1, "text": "b"},
+                                {"inputID": 1, "text": "c"}]}
+
+def test_server_bad_request(running_server):
+    srv, dip = running_server
+    with pytest.raises(HTTPError) as e:
+        _post(srv, {"dis": ["a"], "inputIDs": [1, 2]})
+    assert e.value.code == 400
+    with pytest.raises(HTTPError) as e:
+        _post(srv, {"di": "a"}, path="/unknown")
+    assert e.value.code == 404
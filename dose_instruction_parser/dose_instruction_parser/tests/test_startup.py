@@ -0,0 +1,49 @@
+import subprocess
+import sys
+import time
+from os import path
+
+import pytest
+import dose_instruction_parser
+
+# Modules which are slow to import so should only be imported when needed
+SLOW_MODULES = ("spacy", "pandas", "inflect", "spellchecker", "enlighten", "asyncio")
+
+# Maximum time in seconds to start the command line tool and print help
+STARTUP_BUDGET = 2.0
+
+# Directory containing the dose_instruction_parser package
+PACKAGE_ROOT = path.dirname(path.dirname(dose_instruction_parser.__file__))
+
+def _run_python(*args):
+    return subprocess.run([sys.executable, *args], cwd=PACKAGE_ROOT, 
+                            capture_output=True, text=True, check=True)
+
+@pytest.mark.parametrize("module", [
+    "dose_instruction_parser.parser",
+    "dose_instruction_parser.__main__",
+    "dose_instruction_parser.di_prepare",
+    "dose_instruction_parser.di_dosage",
+    "dose_instruction_parser.di_batch"
+])
+def test_import_is_lazy(module):
+    result = _run_python("-c", 
+        f"import sys, {module}; print(' '.join(sys.modules))")
+    imported = set(result.stdout.split())
+    slow_imported = [m for m in SLOW_MODULES if m in imported]
+    assert slow_imported == [], \
+        f"Importing {module} imports slow modules: {slow_imported}"
+
+def test_startup_time():
+    start = time.perf_counter()
+    _run_python("-m", "dose_instruction_parser", "-h")
+    elapsed = time.perf_counter() - start
+    assert elapsed < STARTUP_BUDGET, \
+        f"Command line startup took {elapsed:.2f}s, budget is {STARTUP_BUDGET}s"
+
+def test_known_forms_dont_import_inflect():
+    result = _run_python("-c",
+        "import sys; from dose_instruction_parser import di_dosage; "
+        "print(di_dosage._to_singular('tablets'), 'inflect' in sys.modules)")
+    assert result.stdout.split() == ["tablet", "False"], \
+        "Converting a known form to singular imports inflect"
@@ -0,0 +1,90 @@
+"""
+Builds the table of form words and their singular used by the dose
+instruction parser, dose_instruction_parser/data/form_words.csv.
+
+Words are taken from:
+    COMMON_FORMS below and their plurals
+    dose_instruction_parser/data/keep_words.txt
+    single words replaced to in dose_instruction_parser/data/replace_words.csv
+    FORM entities, and the form word of DOSAGE entities e.g. "2 tabs",
+    in tagged dose instructions in .dat files in preprocess/processed/
+    and .spacy files in model/data/, if there are any
+
+Run from the top level of the repository after changing any of these:
+    python model/preprocess/build_form_words.py
+"""
+import ast
+import csv
+from os import listdir, path
+
+from dose_instruction_parser import di_dosage
+
+# Forms which should always be in the table
+COMMON_FORMS = ("ampoule", "application", "applicatorful", "bottle", "capful",
+                "caplet", "capsule", "cartridge", "dose", "drop", "enema",
+                "granule", "implant", "inhalation", "inhaler", "injection",
+                "lozenge", "measure", "nasule", "nebule", "pack", "pastille",
+                "patch", "pen", "pessary", "pill", "puff", "pump", "respule",
+                "sachet", "scoop", "spoon", "spoonful", "spray", "strip",
+                "suppository", "syringe", "tab", "tablespoon", "tablet",
+                "teaspoon", "unit", "vial", "wafer")
+
+DATA_DIR = path.join(path.dirname(di_dosage.__file__), "data")
+KEEP_WORDS_FILE = path.join(DATA_DIR, "keep_words.txt")
+REPLACE_WORDS_FILE = path.join(DATA_DIR, "replace_words.csv")
+PROCESSED_DIR = "model/preprocess/processed/"
+SPACY_DIR = "model/data/"
+
+def get_form_word(text, label):
+    """
+    Gets the form word from a FORM or DOSAGE entity text
+    """
+    if label == "FORM":
+        return text
+    if label == "DOSAGE":
+        return di_dosage._get_form_from_dosage_tag(text)
+    return None
+
+def words_from_dat(filepath):
+    """
+    Gets form words from a .dat file created by 1-json_to_dat.py
+    """
+    words = []
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            selections = ast.literal_eval(line.split(" | ", 1)[0])
+            words += [get_form_word(text, label) for text, label in selections]
+    return words
+
+def words_from_spacy(filepath):
+    """
+    Gets form words from a .spacy file created by 2-dat_to_spacy.py
+    """
+    import spacy
+    from spacy.tokens import DocBin
+    vocab = spacy.blank("en").vocab
+    return [get_form_word(ent.text, ent.label_)
+                for doc in DocBin().from_disk(filepath).get_docs(vocab)
+                for ent in doc.ents]
+
+def get_words():
+    engine = di_dosage._get_inflect_engine()
+    words = list(COMMON_FORMS) + [engine.plural_noun(form) for form in COMMON_FORMS]
+    with open(KEEP_WORDS_FILE, "r") as f:
+        words += f.read().split()
+    with open(REPLACE_WORDS_FILE, "r", newline="") as f:
+        words += [row["After"] for row in csv.DictReader(f)
+                    if len(row["After"].split()) == 1]
+    if path.isdir(PROCESSED_DIR):
+        for file in sorted(listdir(PROCESSED_DIR)):
+            if file.endswith(".dat"):
+                words += words_from_dat(path.join(PROCESSED_DIR, file))
+    if path.isdir(SPACY_DIR):
+        for file in sorted(listdir(SPACY_DIR)):
+            if file.endswith(".spacy"):
+                words += words_from_spacy(path.join(SPACY_DIR, file))
+    return [word for word in words if word is not None]
+
+if __name__ == "__main__":
+    table = di_dosage.build_form_table(get_words(), di_dosage.FORM_WORDS_FILE)
+    print(f"Saved {len(table)} form words to {di_dosage.FORM_WORDS_FILE}")